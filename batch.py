@@ -0,0 +1,379 @@
+"""
+Vectorized NumPy evaluation of many hands at once, on top of the tables in the poker module.
+"""
+import time
+import numpy as np
+import poker
+
+
+CARD_KEYS = np.tile(np.array(poker.RANK_KEYS, dtype=np.int64), poker.N_SUITS)
+CHUNK_SIZE = 1 << 14
+
+# Every card adds its rank key to the low 32 bits and one to the 3 bit counter of its suit above them,
+# so a single gather and sum per column gives both the rank table index and the suit counts.
+_SUIT_SHIFTS = 32 + 3 * (np.arange(poker.N_CARDS) // poker.N_RANKS)
+_CARD_SUMS = CARD_KEYS + np.left_shift(1, _SUIT_SHIFTS)
+_CARD_BITS = np.left_shift(1, np.arange(poker.N_CARDS) % poker.N_RANKS)
+_CARD_SUITS = np.arange(poker.N_CARDS) // poker.N_RANKS
+_RANK_ARRAYS = {}
+_FLUSH_ARRAY = []
+
+
+def _flush_suits():
+    '''Table from the 12 bit suit counters to the suit with at least five cards, -1 if none'''
+    counts = np.arange(1 << 12)[:, None] >> (3 * np.arange(poker.N_SUITS)) & 7
+    return np.where(counts.max(axis=1) >= 5, counts.argmax(axis=1), -1).astype(np.int8)
+
+
+_FLUSH_SUITS = _flush_suits()
+
+# Rank key sum and number of cards of every 13 bit rank mask of one suit
+_MASK_RANKS = np.arange(1 << poker.N_RANKS)[:, None] >> np.arange(poker.N_RANKS) & 1
+_MASK_KEYS = _MASK_RANKS @ np.array(poker.RANK_KEYS, dtype=np.int64)
+_MASK_COUNTS = _MASK_RANKS.sum(axis=1)
+del _MASK_RANKS
+
+
+def rank_array(n_cards):
+    '''
+    Returns the rank table of poker.rank_table as a dense array indexed by the key sum
+    :param n_cards: number of cards in the hand, 1-7
+    :return int32 array of strengths
+    '''
+    array = _RANK_ARRAYS.get(n_cards)
+    if array is None:
+        table = poker.rank_table(n_cards)
+        keys = np.fromiter(table.keys(), dtype=np.int64, count=len(table))
+        array = np.zeros(keys.max() + 1, dtype=np.int32)
+        array[keys] = np.fromiter(table.values(), dtype=np.int32, count=len(table))
+        _RANK_ARRAYS[n_cards] = array
+    return array
+
+
+def flush_array():
+    '''Returns the flush table of poker.flush_table as an int32 array'''
+    if not _FLUSH_ARRAY:
+        _FLUSH_ARRAY.append(np.array(poker.flush_table(), dtype=np.int32))
+    return _FLUSH_ARRAY[0]
+
+
+def install_array(key, array):
+    '''
+    Makes rank_array or flush_array return an array built elsewhere, e.g. in shared memory
+    :param key: number of cards of a rank array, or 'flush' for the flush array
+    :param array: the array, equal to the one built here
+    '''
+    if key == 'flush':
+        _FLUSH_ARRAY[:] = [array]
+    else:
+        _RANK_ARRAYS[key] = array
+
+
+def uninstall_array(key, array):
+    '''
+    Removes an array set by install_array, rank_array and flush_array rebuild their own on demand.
+    Nothing is removed if another array was installed since.
+    :param key: number of cards of a rank array, or 'flush' for the flush array
+    :param array: the array installed
+    '''
+    if key == 'flush':
+        if _FLUSH_ARRAY and _FLUSH_ARRAY[0] is array:
+            del _FLUSH_ARRAY[:]
+    elif _RANK_ARRAYS.get(key) is array:
+        del _RANK_ARRAYS[key]
+
+
+def hand_masks(cards):
+    '''
+    Computes the hand bitmasks of many hands
+    :param cards: (N, k) integer array of card codes
+    :return (N,) uint64 array of hand bitmasks
+    '''
+    cards = np.asarray(cards)
+    return np.bitwise_or.reduce(np.left_shift(np.uint64(1), cards.astype(np.uint64)), axis=1)
+
+
+def mask_sizes(masks):
+    '''Returns the (N,) numbers of cards in an (N,) array of hand bitmasks'''
+    masks = np.ascontiguousarray(masks, dtype='<u8')
+    return np.unpackbits(masks.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+
+
+def strength_combos(strengths):
+    '''Returns the CardCombo values of an array of strengths as an int8 array'''
+    return (np.asarray(strengths) >> poker.STRENGTH_SHIFT).astype(np.int8)
+
+
+def _evaluate_chunk(cards, out):
+    columns = np.array(cards.T, dtype=np.intp, order='C')
+    sums = _CARD_SUMS[columns[0]]
+    for column in columns[1:]:
+        sums += _CARD_SUMS[column]
+    np.take(rank_array(len(columns)), sums & 0xFFFFFFFF, out=out)
+    if len(columns) < 5:
+        return
+
+    suits = _FLUSH_SUITS[sums >> 32]
+    rows = np.flatnonzero(suits >= 0)
+    if len(rows):
+        flush_cards = columns[:, rows]
+        flush_suits = suits[rows]
+        suit_ranks = np.zeros(len(rows), dtype=np.intp)
+        for column in flush_cards:
+            suit_ranks |= np.where(_CARD_SUITS[column] == flush_suits, _CARD_BITS[column], 0)
+        out[rows] = flush_array()[suit_ranks]
+
+
+def evaluate_batch(cards, combos=False):
+    '''
+    Computes the strengths of many hands with vectorized table lookups, see poker.evaluate. Unlike
+    poker.evaluate the hands are not checked for repeated cards, a hand holding a card twice gets an
+    undefined strength.
+    :param cards: (N, k) integer array of card codes, 1 <= k <= 7
+    :param combos: if True the CardCombo of every hand is returned as well
+    :return (N,) int32 array of strengths, and an (N,) int8 array of CardCombo values if combos is True
+    :raises ValueError: if the array has the wrong shape or a code is not a card
+    '''
+    cards = np.asarray(cards)
+    if cards.ndim != 2 or not 1 <= cards.shape[1] <= 7:
+        raise ValueError('cards must be an (N, k) array with 1 to 7 cards per hand')
+    if np.any((cards < 0) | (cards >= poker.N_CARDS)):
+        raise ValueError('Card codes must be in 0-51')
+
+    return _evaluate_chunks(_evaluate_chunk, cards, combos)
+
+
+def _evaluate_chunks(evaluate_chunk, hands, combos):
+    '''Evaluates hands chunk by chunk, recording the batch in the active instrumentation'''
+    instrumentation = poker.active_instrumentation()
+    if instrumentation is not None:
+        started = time.perf_counter_ns()
+    strengths = np.empty(len(hands), dtype=np.int32)
+    for start in range(0, len(hands), CHUNK_SIZE):
+        evaluate_chunk(hands[start:start + CHUNK_SIZE], strengths[start:start + CHUNK_SIZE])
+    if instrumentation is not None:
+        instrumentation.record('batch', time.perf_counter_ns() - started)
+        instrumentation.hands += len(strengths)
+        counts = np.bincount(strengths >> poker.STRENGTH_SHIFT, minlength=len(poker.CardCombo))
+        for combo, count in enumerate(counts):
+            instrumentation.combos[combo] += int(count)
+    if combos:
+        return strengths, strength_combos(strengths)
+    return strengths
+
+
+def _evaluate_mask_chunk(masks, out):
+    suits = [np.array(masks >> np.uint64(shift) & np.uint64(0x1FFF), dtype=np.intp)
+             for shift in range(0, poker.N_CARDS, poker.N_RANKS)]
+    keys = _MASK_KEYS[suits[0]] + _MASK_KEYS[suits[1]] + _MASK_KEYS[suits[2]] + _MASK_KEYS[suits[3]]
+    counts = _MASK_COUNTS[suits[0]] + _MASK_COUNTS[suits[1]] + _MASK_COUNTS[suits[2]] + _MASK_COUNTS[suits[3]]
+    if len(counts) and (counts == counts[0]).all():
+        sizes = [(counts[0], slice(None))]
+    else:
+        sizes = [(size, counts == size) for size in np.unique(counts)]
+    for size, rows in sizes:
+        if not 1 <= size <= 7:
+            raise ValueError('Hand masks must have 1 to 7 cards')
+        out[rows] = rank_array(size)[keys[rows]]
+    if counts.max(initial=0) >= 5:
+        flushes = flush_array()
+        for suit in suits:
+            np.maximum(out, flushes[suit], out=out)
+
+
+def evaluate_masks(masks, combos=False):
+    '''
+    Computes the strengths of many hands given as bitmasks, without their card codes. The rank key
+    sum and the number of cards are looked up per 13 bit suit chunk of every mask.
+    :param masks: (N,) integer array of hand bitmasks with 1 to 7 cards each, e.g. a memory map
+    :param combos: if True the CardCombo of every hand is returned as well
+    :return (N,) int32 array of strengths, and an (N,) int8 array of CardCombo values if combos is True
+    '''
+    masks = np.asarray(masks)
+    if masks.ndim != 1:
+        raise ValueError('masks must be an (N,) array')
+    return _evaluate_chunks(_evaluate_mask_chunk, masks, combos)
+
+
+def _evaluate_exact_chunk(n_hole_cards, hole_subsets, board_subsets, cards, out):
+    holes, boards = np.array(cards[:, :n_hole_cards], dtype=np.intp), np.array(cards[:, n_hole_cards:], dtype=np.intp)
+    hole_cards, board_cards = holes[:, hole_subsets], boards[:, board_subsets]
+    sums = _CARD_SUMS[hole_cards].sum(axis=2)[:, :, None] + _CARD_SUMS[board_cards].sum(axis=2)[:, None, :]
+    strengths = rank_array(5)[sums & 0xFFFFFFFF]
+    flushes = _FLUSH_SUITS[sums >> 32] >= 0
+    if flushes.any():
+        # The five cards of a flush have distinct ranks, so the sum of their rank bits is the rank mask
+        rank_masks = _CARD_BITS[hole_cards].sum(axis=2)[:, :, None] + _CARD_BITS[board_cards].sum(axis=2)[:, None, :]
+        strengths[flushes] = flush_array()[rank_masks[flushes]]
+    strengths.reshape(len(cards), -1).max(axis=1, out=out)
+
+
+def evaluate_exact(holes, boards, n_hole=2, combos=False):
+    '''
+    Computes the strengths of many hands that must use exactly n_hole hole cards and 5 - n_hole
+    board cards, see poker.evaluate_exact. The hole and board subsets of every hand are combined
+    from their rank key sums, so the 60 five-card hands of an Omaha hand are never built.
+    :param holes: (N, h) integer array of hole cards, h >= n_hole
+    :param boards: (N, b) integer array of board cards, b >= 5 - n_hole
+    :param n_hole: number of hole cards to use
+    :param combos: if True the CardCombo of every hand is returned as well
+    :return (N,) int32 array of strengths, and an (N,) int8 array of CardCombo values if combos is True
+    '''
+    holes, boards = np.asarray(holes), np.asarray(boards)
+    if holes.ndim != 2 or boards.ndim != 2 or len(holes) != len(boards):
+        raise ValueError('holes and boards must be (N, h) and (N, b) arrays')
+    if not 0 <= n_hole <= 5 or holes.shape[1] < n_hole or boards.shape[1] < 5 - n_hole:
+        raise ValueError('Need %d hole cards and %d board cards' % (n_hole, 5 - n_hole))
+    hole_subsets = combinations(holes.shape[1], n_hole)
+    board_subsets = combinations(boards.shape[1], 5 - n_hole)
+
+    def evaluate_chunk(cards, out):
+        step = max(1, CHUNK_SIZE // (len(hole_subsets) * len(board_subsets)))
+        for start in range(0, len(cards), step):
+            _evaluate_exact_chunk(holes.shape[1], hole_subsets, board_subsets,
+                                  cards[start:start + step], out[start:start + step])
+    return _evaluate_chunks(evaluate_chunk, np.hstack([holes, boards]), combos)
+
+
+def mask_cards(masks, n_cards):
+    '''
+    Decodes hand bitmasks with the same number of cards into card codes
+    :param masks: (N,) integer array of hand bitmasks
+    :param n_cards: number of cards in every hand
+    :return (N, n_cards) int8 array of card codes, in increasing order
+    '''
+    masks = np.ascontiguousarray(masks, dtype='<u8')
+    if not (mask_sizes(masks) == n_cards).all():
+        raise ValueError('Every mask must have %d cards' % n_cards)
+    bits = np.unpackbits(masks.view(np.uint8).reshape(-1, 8), axis=1, bitorder='little')
+    rows, codes = np.nonzero(bits)
+    return codes.astype(np.int8).reshape(-1, n_cards)
+
+
+def live_cards(dead):
+    '''
+    Lists the cards left in the deck
+    :param dead: the cards out of the deck, PlayingCard objects or card codes
+    :return int8 array of the card codes not in dead, in increasing order
+    '''
+    dead = set(poker.card_codes(dead))
+    return np.array([code for code in range(poker.N_CARDS) if code not in dead], dtype=np.int8)
+
+
+def shuffled_decks(k, rng, dead=()):
+    '''
+    Shuffles k independent decks in one vectorized call
+    :param k: number of decks
+    :param rng: the numpy.random.Generator to draw from
+    :param dead: cards left out of every deck
+    :return (k, n) int8 array of card codes, every row a random permutation of the live cards
+    '''
+    return rng.permuted(np.tile(live_cards(dead), (k, 1)), axis=1)
+
+
+def deal_cards(k, n, rng, dead=()):
+    '''
+    Deals n cards from each of k independently shuffled decks. Only the n dealt positions are
+    drawn, with a Fisher-Yates shuffle vectorized over the decks.
+    :param k: number of decks
+    :param n: number of cards dealt from each deck
+    :param rng: the numpy.random.Generator to draw from
+    :param dead: cards left out of every deck
+    :return (k, n) int8 array of card codes
+    '''
+    decks = np.tile(live_cards(dead), (k, 1))
+    width = decks.shape[1]
+    if n > width:
+        raise ValueError('Only %d cards left in the deck' % width)
+    rows = np.arange(k)
+    for i in range(n):
+        j = rng.integers(i, width, size=k)
+        card = decks[rows, j]
+        decks[rows, j] = decks[:, i]
+        decks[:, i] = card
+    return decks[:, :n]
+
+
+def deal_excluding(dead, n, rng):
+    '''
+    Deals n cards for every row of dead cards, each row from its own deck without that row's dead
+    cards. Cards are drawn one column at a time and redrawn where they hit a dead or dealt card,
+    which are tracked as a bitmask per row.
+    :param dead: (k, d) integer array with the dead cards of each row
+    :param n: number of cards dealt for each row
+    :param rng: the numpy.random.Generator to draw from
+    :return (k, n) array of card codes
+    '''
+    used = np.bitwise_or.reduce(np.left_shift(1, np.array(dead, dtype=np.int64)), axis=1)
+    dealt = np.empty((len(used), n), dtype=np.intp)
+    for column in range(n):
+        pending = np.arange(len(used))
+        while len(pending):
+            cards = rng.integers(0, poker.N_CARDS, size=len(pending))
+            free = (used[pending] >> cards) & 1 == 0
+            rows = pending[free]
+            dealt[rows, column] = cards[free]
+            used[rows] |= np.left_shift(1, cards[free])
+            pending = pending[~free]
+    return dealt
+
+
+def deal_hands(k, n_players, rng, board=(), dead=(), n_hole=2):
+    '''
+    Deals k random tables, the hole cards of every player and the rest of the board
+    :param k: number of tables
+    :param n_players: number of players dealt at each table
+    :param rng: the numpy.random.Generator to draw from
+    :param board: the cards already on the table, shared by all tables
+    :param dead: other known cards that can not be dealt
+    :param n_hole: number of hole cards per player
+    :return (k, n_players, n_hole) array of hole cards and (k, 5) array of boards
+    '''
+    board = poker.card_codes(board)
+    n_board = 5 - len(board)
+    dealt = deal_cards(k, n_players * n_hole + n_board, rng, board + poker.card_codes(dead))
+    boards = np.hstack([np.tile(np.array(board, dtype=np.int8), (k, 1)), dealt[:, :n_board]])
+    return dealt[:, n_board:].reshape(k, n_players, n_hole), boards
+
+
+def combinations(n, k):
+    '''
+    Builds all k-combinations of range(n) in lexicographic order, the vectorized
+    counterpart of itertools.combinations
+    :param n: number of items
+    :param k: number of items in each combination
+    :return (C(n, k), k) int array, one combination per row in increasing order
+    '''
+    if not 0 <= k <= n:
+        return np.zeros((0, k), dtype=np.intp)
+    combos = np.zeros((1, 0), dtype=np.intp)
+    for j in range(k):
+        first = combos[:, -1] + 1 if j else np.zeros(1, dtype=np.intp)
+        counts = n - k + j + 1 - first
+        offsets = np.repeat(first - (np.cumsum(counts) - counts), counts)
+        combos = np.hstack([np.repeat(combos, counts, axis=0), (np.arange(counts.sum()) + offsets)[:, None]])
+    return combos
+
+
+def showdown_batch(holes, boards, n_hole=None):
+    '''
+    Resolves the showdowns of many tables at once, see poker.showdown
+    :param holes: (T, P, h) array with the h hole cards of the P players at each of T tables
+    :param boards: (T, 5) array with the board of each table
+    :param n_hole: if given, every player must use exactly n_hole hole cards, see evaluate_exact
+    :return a poker.Showdown of arrays: (T, P) strengths, (T, P) boolean winner mask,
+        (T, P) player indices from best to worst and (T, P) ranks
+    '''
+    holes = np.asarray(holes)
+    boards = np.asarray(boards)
+    n_tables, n_players = holes.shape[:2]
+    boards = np.broadcast_to(boards[:, None, :], (n_tables, n_players, boards.shape[1])).reshape(n_tables * n_players, -1)
+    holes = holes.reshape(n_tables * n_players, -1)
+    if n_hole is None:
+        strengths = evaluate_batch(np.hstack([holes, boards]))
+    else:
+        strengths = evaluate_exact(holes, boards, n_hole)
+    strengths = strengths.reshape(n_tables, n_players)
+    ranks = (strengths[:, None, :] > strengths[:, :, None]).sum(axis=2)
+    order = np.argsort(-strengths, axis=1, kind='stable')
+    return poker.Showdown(strengths, ranks == 0, order, ranks)
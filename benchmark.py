@@ -0,0 +1,317 @@
+"""
+Benchmarks of the card library hot paths. Every benchmark reports operations per second and latency
+percentiles, results are saved as JSON and can be compared against a saved baseline.
+
+    python benchmark.py --output results.json --baseline baseline.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import numpy as np
+import poker
+import batch
+import boardtable
+import handstrength
+import outs
+import ranges
+
+
+BENCHMARKS = []
+_CATEGORY_HANDS = {}
+
+
+def benchmark(name, number=1000, units=1, self_timed=False):
+    '''
+    Registers a benchmark. The decorated function gets a numpy.random.Generator and returns the
+    function to time, which is called number times per round and handles units operations per call.
+    A self_timed function measures itself and returns the seconds it took.
+    '''
+    def register(make):
+        BENCHMARKS.append((name, make, number, units, self_timed))
+        return make
+    return register
+
+
+def _import_time(module):
+    '''Returns the seconds it takes to import a module in a fresh interpreter, from -X importtime'''
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import %s' % module],
+                             stderr=subprocess.PIPE, universal_newlines=True, check=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)))
+    for line in process.stderr.splitlines():
+        fields = [field.strip() for field in line.split('|')]
+        if len(fields) == 3 and fields[2] == module:
+            return int(fields[1]) * 1e-6
+    raise RuntimeError('No import time reported for %s' % module)
+
+
+@benchmark('import poker', number=1, self_timed=True)
+def bench_import_poker(rng):
+    return lambda: _import_time('poker')
+
+
+@benchmark('import batch', number=1, self_timed=True)
+def bench_import_batch(rng):
+    return lambda: _import_time('batch')
+
+
+def _category_hands(rng, per_category=200):
+    '''Deals random 7-card hands until there are per_category hands of every CardCombo, once per run'''
+    if not _CATEGORY_HANDS:
+        hands = {combo: [] for combo in poker.CardCombo}
+        while min(len(category) for category in hands.values()) < per_category:
+            cards = batch.deal_cards(1 << 18, 7, rng)
+            combos = batch.evaluate_batch(cards, combos=True)[1]
+            for combo in poker.CardCombo:
+                missing = per_category - len(hands[combo])
+                hands[combo].extend([int(code) for code in hand] for hand in cards[combos == combo][:missing])
+        _CATEGORY_HANDS.update(hands)
+    return _CATEGORY_HANDS
+
+
+@benchmark('Deck()', number=200)
+def bench_deck(rng):
+    return poker.Deck
+
+
+@benchmark('Deck.shuffle_deck', number=1000)
+def bench_shuffle_deck(rng):
+    deck = poker.Deck()
+    return lambda: deck.shuffle_deck(rng)
+
+
+@benchmark('Deck.take_top_card', number=100, units=52)
+def bench_take_top_card(rng):
+    deck = poker.Deck()
+
+    def take_all():
+        deck.reset()
+        for _ in range(52):
+            deck.take_top_card()
+    return take_all
+
+
+@benchmark('PlayerHand.give_card', number=200, units=7)
+def bench_give_card(rng):
+    cards = [poker.decode_card(code) for code in range(7)]
+
+    def give_all():
+        hand = poker.PlayerHand()
+        for card in cards:
+            hand.give_card(card)
+    return give_all
+
+
+def _bench_best_poker_hand(combo):
+    def make(rng):
+        hands = _category_hands(rng)[combo]
+        players = []
+        for codes in hands:
+            player = poker.PlayerHand()
+            player.give_card(codes[0])
+            player.give_card(codes[1])
+            players.append((player, codes[2:]))
+
+        def evaluate_all():
+            for player, table in players:
+                player.best_poker_hand(table)
+        return evaluate_all
+    return make
+
+
+for _combo in poker.CardCombo:
+    benchmark('best_poker_hand %s' % _combo.name, number=5, units=200)(_bench_best_poker_hand(_combo))
+
+
+@benchmark('evaluate', number=20, units=1000)
+def bench_evaluate(rng):
+    hands = [[int(code) for code in hand] for hand in batch.deal_cards(1000, 7, rng)]
+
+    def evaluate_all():
+        for hand in hands:
+            poker.evaluate(hand)
+    return evaluate_all
+
+
+@benchmark('evaluate_batch', number=3, units=1 << 20)
+def bench_evaluate_batch(rng):
+    hands = batch.deal_cards(1 << 20, 7, rng)
+    return lambda: batch.evaluate_batch(hands)
+
+
+@benchmark('evaluate_masks', number=3, units=1 << 20)
+def bench_evaluate_masks(rng):
+    masks = batch.hand_masks(batch.deal_cards(1 << 20, 7, rng))
+    return lambda: batch.evaluate_masks(masks)
+
+
+@benchmark('best_poker_hand omaha', number=5, units=200)
+def bench_best_poker_hand_omaha(rng):
+    players = []
+    for codes in batch.deal_cards(200, 9, rng).tolist():
+        player = poker.PlayerHand(n_hole=2)
+        for code in codes[:4]:
+            player.give_card(code)
+        players.append((player, codes[4:]))
+
+    def evaluate_all():
+        for player, table in players:
+            player.best_poker_hand(table)
+    return evaluate_all
+
+
+@benchmark('evaluate_exact omaha', number=3, units=1 << 18)
+def bench_evaluate_exact(rng):
+    hands = batch.deal_cards(1 << 18, 9, rng)
+    return lambda: batch.evaluate_exact(hands[:, :4], hands[:, 4:])
+
+
+@benchmark('PokerHand compare', number=20, units=1000)
+def bench_pokerhand_compare(rng):
+    strengths = batch.evaluate_batch(batch.deal_cards(1001, 7, rng))
+    hands = [poker.PokerHand.from_strength(int(strength)) for strength in strengths]
+    pairs = list(zip(hands[:-1], hands[1:]))
+
+    def compare_all():
+        for first, second in pairs:
+            first < second
+    return compare_all
+
+
+@benchmark('PokerHand sort', number=20, units=1000)
+def bench_pokerhand_sort(rng):
+    strengths = batch.evaluate_batch(batch.deal_cards(1000, 7, rng))
+    hands = [poker.PokerHand.from_strength(int(strength)) for strength in strengths]
+    return lambda: sorted(hands)
+
+
+@benchmark('range_equity flop', number=1, units=1)
+def bench_range_equity(rng):
+    board = [poker.parse_card(name) for name in ('Ah', '7d', '2c')]
+    return lambda: ranges.range_equity('QQ+, AKs, 76s-54s', '22+, A2s+, KTo+', board)
+
+
+@benchmark('board_table', number=20, units=1)
+def bench_board_table(rng):
+    board = batch.deal_cards(1, 5, rng)[0].tolist()
+    return lambda: boardtable.board_table(board, cache=None)
+
+
+@benchmark('BoardTable outcomes', number=20, units=1081)
+def bench_board_table_outcomes(rng):
+    table = boardtable.board_table(batch.deal_cards(1, 5, rng)[0].tolist(), cache=None)
+    return lambda: table.outcomes(table.pairs)
+
+
+@benchmark('next_cards turn and river', number=50, units=1)
+def bench_next_cards(rng):
+    hero, board, villain = [poker.parse_cards(text) for text in ('Ah 5h', 'Kh 9h 2c', 'Ks Kd')]
+    return lambda: outs.next_cards(hero, board, [villain], n_cards=2)
+
+
+@benchmark('board_strengths flop', number=1, units=1)
+def bench_board_strengths(rng):
+    board = batch.deal_cards(1, 3, rng)[0].tolist()
+    return lambda: handstrength.board_strengths(board)
+
+
+def run(names=None, repeat=20, seed=0):
+    '''
+    Runs the benchmarks
+    :param names: the names of the benchmarks to run, all if None
+    :param repeat: number of rounds of timed calls per benchmark
+    :param seed: seed of the Generator used to deal the benchmark hands
+    :return a dict with the environment and, per benchmark, ops/sec over all calls and the
+        percentiles of the latency per operation in seconds. Every call is timed on its own, so the
+        percentiles are taken over repeat * number calls, each divided by the operations it handles.
+    '''
+    results = {}
+    _CATEGORY_HANDS.clear()
+    for name, make, number, units, self_timed in BENCHMARKS:
+        if names is not None and name not in names:
+            continue
+        function = make(np.random.default_rng(seed))
+        function()
+        latencies = []
+        for _ in range(repeat * number):
+            start = time.perf_counter()
+            seconds = function()
+            if not self_timed:
+                seconds = time.perf_counter() - start
+            latencies.append(seconds / units)
+        latencies = np.array(latencies)
+        results[name] = {
+            'ops_per_sec': 1 / float(latencies.mean()),
+            'p50': float(np.percentile(latencies, 50)),
+            'p90': float(np.percentile(latencies, 90)),
+            'p99': float(np.percentile(latencies, 99)),
+            'mean': float(latencies.mean()),
+            'calls': len(latencies),
+        }
+    return {
+        'python': sys.version.split()[0],
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'benchmarks': results,
+    }
+
+
+def compare(results, baseline, threshold=0.1):
+    '''
+    Compares results against a baseline
+    :param threshold: relative slowdown of the median latency counted as a regression
+    :return a dict from benchmark name to the ratio of the new and baseline median latency, and
+        the list of regressed benchmark names
+    '''
+    ratios = {}
+    regressions = []
+    for name, result in results['benchmarks'].items():
+        if name not in baseline['benchmarks']:
+            continue
+        ratios[name] = result['p50'] / baseline['benchmarks'][name]['p50']
+        if ratios[name] > 1 + threshold:
+            regressions.append(name)
+    return ratios, regressions
+
+
+def report(results, ratios=None):
+    '''Returns the results as a text table'''
+    lines = ['%-34s %14s %11s %11s %11s %9s' % ('benchmark', 'ops/sec', 'p50 us', 'p90 us', 'p99 us', 'baseline')]
+    for name, result in results['benchmarks'].items():
+        ratio = '%8.2fx' % ratios[name] if ratios and name in ratios else ''
+        lines.append('%-34s %14.0f %11.3f %11.3f %11.3f %9s' % (
+            name, result['ops_per_sec'], result['p50'] * 1e6, result['p90'] * 1e6, result['p99'] * 1e6, ratio))
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmarks the card library hot paths.')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--baseline', help='compare against the results in this JSON file')
+    parser.add_argument('--threshold', type=float, default=0.1, help='relative slowdown counted as a regression')
+    parser.add_argument('--repeat', type=int, default=20, help='rounds of timed calls per benchmark')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('names', nargs='*', help='benchmarks to run, all by default')
+    args = parser.parse_args(argv)
+
+    results = run(args.names or None, args.repeat, args.seed)
+    ratios, regressions = None, []
+    if args.baseline:
+        with open(args.baseline) as file:
+            ratios, regressions = compare(results, json.load(file), args.threshold)
+    print(report(results, ratios))
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2, sort_keys=True)
+    if regressions:
+        print('Regressions: %s' % ', '.join(regressions))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,177 @@
+"""
+Strength tables of complete boards. On a fixed board of 5 cards every one of the 1081 hole card
+pairs left has a fixed strength, so they are evaluated once in a single batch, sorted, and kept
+per board. Showdowns, range matchups and counts of the hands beating a pair are then lookups and
+binary searches in these arrays.
+"""
+import numpy as np
+import poker
+import batch
+
+
+# Number of boards whose tables are kept by board_table
+CACHE_SIZE = 1 << 8
+CACHE = poker.LRUCache(CACHE_SIZE)
+
+# Strengths of the pairs holding a card are sorted together, keyed by card above the strength bits
+_CARD_SHIFT = 24
+# All C(52, 2) hole card pairs in the order of batch.combinations and, for every two cards, the index of
+# their pair, -1 for a card with itself
+PAIRS = batch.combinations(poker.N_CARDS, 2)
+PAIR_INDEX = np.full((poker.N_CARDS, poker.N_CARDS), -1, dtype=np.intp)
+PAIR_INDEX[PAIRS[:, 0], PAIRS[:, 1]] = PAIR_INDEX[PAIRS[:, 1], PAIRS[:, 0]] = np.arange(len(PAIRS))
+_PAIR_MASKS = batch.hand_masks(PAIRS)
+
+
+class BoardTable(object):
+    """
+    The BoardTable class holds the strengths of all hole card pairs on a board. The pairs and
+    their strengths are sorted from the weakest to the strongest, positions maps the index of
+    every pair among all C(52, 2) pairs to its position in the table, -1 for the pairs sharing a
+    card with the board.
+    """
+    def __init__(self, board):
+        self.board = tuple(board)
+        live = (_PAIR_MASKS & np.uint64(poker.hand_mask(self.board))) == 0
+        pairs = PAIRS[live]
+        strengths = batch.evaluate_batch(np.hstack([pairs, np.tile(np.array(self.board), (len(pairs), 1))]))
+        order = np.argsort(strengths, kind='stable')
+        self.pairs = pairs[order].astype(np.int8)
+        self.strengths = strengths[order].astype(np.int64)
+        self.positions = np.full(len(PAIRS), -1, dtype=np.intp)
+        self.positions[np.flatnonzero(live)[order]] = np.arange(len(order))
+        # Number of pairs weaker than every entry, the rank index of the table
+        self.ranks = np.searchsorted(self.strengths, self.strengths, side='left')
+
+        card_keys = (self.pairs.astype(np.int64) << _CARD_SHIFT) + self.strengths[:, None]
+        self._card_keys = np.sort(card_keys.ravel())
+        self._card_starts = np.searchsorted(self._card_keys, np.arange(poker.N_CARDS + 1, dtype=np.int64) << _CARD_SHIFT)
+
+    def __len__(self):
+        return len(self.pairs)
+
+    def position(self, holes):
+        '''
+        Finds hole card pairs in the table
+        :param holes: (..., 2) array of hole card pairs
+        :return (...) array of positions in the table
+        :raises ValueError: if a pair repeats a card or shares a card with the board
+        '''
+        holes = np.asarray(holes, dtype=np.intp)
+        pairs = PAIR_INDEX[holes[..., 0], holes[..., 1]]
+        positions = np.where(pairs >= 0, self.positions[pairs], -1)
+        if np.any(positions < 0):
+            raise ValueError('The hole cards must be two different cards not on the board')
+        return positions
+
+    def lookup(self, holes):
+        '''Returns the (...) strengths of an (..., 2) array of hole card pairs on the board'''
+        return self.strengths[self.position(holes)]
+
+    def rank(self, holes):
+        '''Returns the (...) numbers of pairs weaker than an (..., 2) array of hole card pairs, whatever cards they hold'''
+        return self.ranks[self.position(holes)]
+
+    def outcomes(self, holes):
+        '''
+        Counts the opponent pairs beating, tying and losing to hole card pairs. The pairs holding a
+        card of the hole cards are taken out by card removal: the pairs holding the first card
+        and the second card are subtracted, and the hole cards themselves, subtracted twice and
+        counted as a tie, are added back.
+        :param holes: (..., 2) array of hole card pairs
+        :return (...) arrays of the numbers of pairs beating, tying and losing to every pair
+        '''
+        holes = np.asarray(holes, dtype=np.intp)
+        strengths = self.lookup(holes)
+        worse = np.searchsorted(self.strengths, strengths, side='left')
+        not_better = np.searchsorted(self.strengths, strengths, side='right')
+        better, tied = len(self) - not_better, not_better - worse
+        for side in range(2):
+            cards = holes[..., side]
+            starts, stops = self._card_starts[cards], self._card_starts[cards + 1]
+            keys = (cards.astype(np.int64) << _CARD_SHIFT) + strengths
+            card_worse = np.searchsorted(self._card_keys, keys, side='left')
+            card_not_better = np.searchsorted(self._card_keys, keys, side='right')
+            worse -= card_worse - starts
+            tied -= card_not_better - card_worse
+            better -= stops - card_not_better
+        return better, tied + 1, worse
+
+    def hand_strength(self, holes):
+        '''Returns the (...) fractions of the opponent pairs beaten by hole card pairs, ties counted as half'''
+        better, tied, worse = self.outcomes(holes)
+        return (worse + tied / 2.) / (better + tied + worse)
+
+    def showdown(self, holes):
+        '''
+        Resolves showdowns on the board, see batch.showdown_batch
+        :param holes: (T, P, 2) array with the hole cards of the P players at each of T tables
+        :return a poker.Showdown of (T, P) arrays
+        '''
+        strengths = self.lookup(holes)
+        ranks = (strengths[:, None, :] > strengths[:, :, None]).sum(axis=2)
+        order = np.argsort(-strengths, axis=1, kind='stable')
+        return poker.Showdown(strengths, ranks == 0, order, ranks)
+
+
+def _group_counts(keys, n_groups):
+    '''
+    Counts the entries of the same group below and up to every entry, keyed by group above the
+    strength bits. The keys are sorted once and the runs of equal keys give both counts.
+    :return the counts of entries below and up to every entry, and the (n_groups,) group sizes
+    '''
+    order = np.argsort(keys, axis=None)
+    sorted_keys = keys.ravel()[order]
+    starts = np.searchsorted(sorted_keys, np.arange(n_groups + 1, dtype=np.int64) << _CARD_SHIFT)
+    indices = np.arange(keys.size)
+    changes = sorted_keys[1:] != sorted_keys[:-1]
+    firsts = np.maximum.accumulate(np.where(np.concatenate([[True], changes]), indices, 0))
+    lasts = np.minimum.accumulate(np.where(np.concatenate([changes, [True]]), indices + 1, keys.size)[::-1])[::-1]
+    group_starts = starts[sorted_keys >> _CARD_SHIFT]
+    below, up_to = np.empty_like(indices), np.empty_like(indices)
+    below[order] = firsts - group_starts
+    up_to[order] = lasts - group_starts
+    return below.reshape(keys.shape), up_to.reshape(keys.shape), np.diff(starts)
+
+
+def hand_strengths(boards):
+    '''
+    Computes the hand strength of every hole card pair on many complete boards at once, the
+    fraction of the opponent pairs it beats with ties counted as half, see BoardTable.hand_strength.
+    The pairs of all boards are evaluated in one batch and counted in sorts keyed by board, with
+    the same card removal as BoardTable.outcomes.
+    :param boards: (R, 5) array of boards
+    :return (R, C(52, 2)) float array over the pairs of batch.combinations(52, 2), nan for the
+        pairs sharing a card with the board
+    '''
+    boards = np.asarray(boards, dtype=np.int8)
+    rows, pairs = np.nonzero((batch.hand_masks(boards)[:, None] & _PAIR_MASKS[None]) == 0)
+    strengths = batch.evaluate_batch(np.hstack([PAIRS[pairs], boards[rows]]))
+    keys = (rows.astype(np.int64) << _CARD_SHIFT) + strengths
+    worse, not_better, sizes = _group_counts(keys, len(boards))
+    faced = sizes[rows] + 1
+
+    card_keys = ((rows[:, None] * poker.N_CARDS + PAIRS[pairs]).astype(np.int64) << _CARD_SHIFT) + strengths[:, None]
+    card_worse, card_not_better, card_sizes = _group_counts(card_keys, len(boards) * poker.N_CARDS)
+    worse -= card_worse.sum(axis=1)
+    not_better -= card_not_better.sum(axis=1)
+    faced -= card_sizes[card_keys >> _CARD_SHIFT].sum(axis=1)
+    result = np.full((len(boards), len(PAIRS)), np.nan)
+    result[rows, pairs] = (worse + (not_better - worse + 1) / 2.) / faced
+    return result
+
+
+def board_table(board, cache=CACHE):
+    '''
+    Returns the BoardTable of a board, built once and kept in a cache
+    :param board: the 5 cards on the table, PlayingCard objects or card codes
+    :param cache: the poker.LRUCache of tables, a new table is built every call if None
+    :raises ValueError: if the board is not 5 different cards
+    '''
+    board = poker.card_codes(board)
+    if len(board) != 5 or len(set(board)) != 5 or any(not 0 <= code < poker.N_CARDS for code in board):
+        raise ValueError('The board must be 5 different cards')
+    board = tuple(sorted(board))
+    if cache is None:
+        return BoardTable(board)
+    return cache.lookup(board, lambda: BoardTable(board))
@@ -0,0 +1,292 @@
+"""
+Equity of a hand against one or more opponents, estimated by dealing random runouts.
+"""
+import collections
+import os
+import statistics
+import time
+import numpy as np
+import poker
+import batch
+import shared
+
+
+Equity = collections.namedtuple('Equity', ['win', 'tie', 'loss', 'trials'])
+Equity.__doc__ = '''The fractions of runouts won, tied and lost by the hero, and the number of runouts'''
+
+AdaptiveEquity = collections.namedtuple('AdaptiveEquity', ['equity', 'low', 'high', 'standard_error', 'win', 'tie',
+                                                             'loss', 'trials', 'converged'])
+AdaptiveEquity.__doc__ = '''The estimated equity of the hero, ties split between the tied players, with its confidence
+interval and standard error, the win, tie and loss fractions, the number of runouts and whether the precision was reached'''
+
+CHUNK_TRIALS = 1 << 14
+# Number of chunks the trials of monte_carlo_equity are split into, enough to keep the cores busy, the
+# chunks are only made smaller than MIN_TRIALS or larger than CHUNK_TRIALS by adding or removing chunks
+N_CHUNKS = 64
+# First round of adaptive sampling, the rounds double up to CHUNK_TRIALS
+MIN_TRIALS = 1 << 10
+
+
+def hole_codes(hole, name='The hand'):
+    '''
+    Converts the hole cards of a player to card codes
+    :param hole: the two hole cards, PlayingCard objects or card codes
+    :param name: the player named in the error message
+    :return the list of the 2 card codes
+    :raises ValueError: if there are not exactly 2 hole cards
+    '''
+    codes = poker.card_codes(hole)
+    if len(codes) != 2:
+        raise ValueError('%s must have 2 hole cards' % name)
+    return codes
+
+
+def _hand_codes(hand, n_max, name):
+    codes = poker.card_codes(hand)
+    if len(codes) > n_max:
+        raise ValueError('%s has more than %d cards' % (name, n_max))
+    return codes
+
+
+def check_cards(hero, villains, board):
+    '''
+    Validates a spot
+    :param hero: the card codes of the hero
+    :param villains: list of the card codes of every villain
+    :param board: the card codes on the table
+    :return int8 array of the codes of the cards left in the deck, in increasing order
+    :raises ValueError: if a card is dealt twice or a code is not a card
+    '''
+    known = hero + board + [code for villain in villains for code in villain]
+    if len(set(known)) != len(known):
+        raise ValueError('The same card is dealt twice')
+    if any(not 0 <= code < poker.N_CARDS for code in known):
+        raise ValueError('Card codes must be in 0-51')
+    return np.array(sorted(set(range(poker.N_CARDS)) - set(known)), dtype=np.int8)
+
+
+def _showdown_counts(hero_strengths, villain_strengths):
+    '''Counts the wins, ties and losses of the hero against the best villain of every runout'''
+    best = villain_strengths.max(axis=0) if len(villain_strengths) else np.zeros_like(hero_strengths)
+    wins = int(np.count_nonzero(hero_strengths > best))
+    ties = int(np.count_nonzero(hero_strengths == best))
+    return np.array([wins, ties, len(hero_strengths) - wins - ties], dtype=np.int64)
+
+
+def _simulate(job):
+    '''
+    Deals and evaluates random runouts, the work of a single process
+    :param job: tuple of hero, villains, number of random villains, board, trials and SeedSequence
+    :return array with the number of wins, ties and losses
+    '''
+    hero, villains, n_random, board, trials, seed = job
+    rng = np.random.default_rng(seed)
+    known = hero + [code for villain in villains for code in villain]
+    random_holes, boards = batch.deal_hands(trials, n_random, rng, board, known)
+
+    holes = [np.tile(np.array(hole, dtype=np.int8), (trials, 1)) for hole in [hero] + villains]
+    holes += [random_holes[:, i] for i in range(n_random)]
+    strengths = player_strengths(holes, boards)
+    return _showdown_counts(strengths[0], strengths[1:])
+
+
+def player_strengths(holes, boards):
+    '''
+    Evaluates every player on every board
+    :param holes: list of (N, 2) arrays with the hole cards of each player
+    :param boards: (N, 5) array of boards
+    :return (players, N) array of strengths
+    '''
+    return np.array([batch.evaluate_batch(np.hstack([hole, boards])) for hole in holes])
+
+
+def monte_carlo_equity(hero, villains=(), n_villains=None, board=(), trials=100000, processes=None, seed=None,
+                       tables=None, pool=None, chunk_trials=None):
+    '''
+    Estimates the equity of the hero by dealing random runouts in a pool of processes. The trials
+    are split into chunks with their own random stream spawned from the seed, the chunk size only
+    depends on the number of trials, so the result only depends on the seed and not on the number
+    of processes.
+    :param hero: the two hole cards of the hero, PlayingCard objects or card codes
+    :param villains: list of the hole cards of known opponents
+    :param n_villains: number of opponents with random hole cards, 1 if None and no villains are given
+    :param board: the 0-5 cards already on the table
+    :param trials: number of runouts to deal
+    :param processes: number of worker processes, all cores if None, no pool if 1
+    :param seed: seed for numpy.random.SeedSequence, fresh entropy if None
+    :param tables: the shared.SharedTables of the workers, created for the call if None
+    :param pool: a pool started by shared.pool, reused instead of starting one for the call, processes
+        and tables are then ignored
+    :param chunk_trials: number of runouts per chunk, about trials / N_CHUNKS between MIN_TRIALS
+        and CHUNK_TRIALS if None
+    :return an Equity with the win, tie and loss fractions of the hero
+    '''
+    if trials < 1:
+        raise ValueError('At least one trial is needed')
+    hero = hole_codes(hero, 'The hero')
+    villains = [hole_codes(villain, 'A villain') for villain in villains]
+    board = _hand_codes(board, 5, 'The board')
+    if n_villains is None:
+        n_villains = 0 if villains else 1
+    remaining = check_cards(hero, villains, board)
+    if len(remaining) < 5 - len(board) + 2 * n_villains:
+        raise ValueError('Not enough cards left in the deck')
+
+    if chunk_trials is None:
+        chunk_trials = min(max(-(-trials // N_CHUNKS), MIN_TRIALS), CHUNK_TRIALS)
+    if chunk_trials < 1:
+        raise ValueError('Chunks need at least one trial')
+    n_chunks = -(-trials // chunk_trials)
+    seeds = np.random.SeedSequence(seed).spawn(n_chunks)
+    jobs = [(hero, villains, n_villains, board, min(chunk_trials, trials - i * chunk_trials), seeds[i])
+            for i in range(n_chunks)]
+
+    if processes is None:
+        processes = os.cpu_count() or 1
+    processes = min(processes, n_chunks)
+    if pool is not None:
+        counts = pool.map(_simulate, jobs)
+    elif processes <= 1:
+        counts = [_simulate(job) for job in jobs]
+    else:
+        with shared.pool(processes, tables, n_cards=(7,)) as workers:
+            counts = workers.map(_simulate, jobs)
+
+    wins, ties, losses = np.sum(counts, axis=0)
+    return Equity(float(wins) / trials, float(ties) / trials, float(losses) / trials, trials)
+
+
+def exact_equity(hero, villains, board=(), cache=None):
+    '''
+    Computes the exact equity of the hero against known villains by enumerating every
+    completion of the board, each player is evaluated once per runout.
+    :param hero: the two hole cards of the hero, PlayingCard objects or card codes
+    :param villains: list of the hole cards of the opponents
+    :param board: the 0-5 cards already on the table
+    :param cache: an optional poker.LRUCache, spots equal up to a suit permutation are computed once
+    :return an Equity with the win, tie and loss fractions of the hero over all runouts
+    '''
+    hero = hole_codes(hero, 'The hero')
+    villains = [hole_codes(villain, 'A villain') for villain in villains]
+    board = _hand_codes(board, 5, 'The board')
+    if not villains:
+        raise ValueError('Exact equity needs the hole cards of the villains')
+    remaining = check_cards(hero, villains, board)
+    if cache is not None:
+        key = ('exact_equity',) + poker.canonical_form(hero, board, *villains)
+        return cache.lookup(key, lambda: _exact_equity(hero, villains, board, remaining))
+    return _exact_equity(hero, villains, board, remaining)
+
+
+def _exact_equity(hero, villains, board, remaining):
+    runouts = remaining[batch.combinations(len(remaining), 5 - len(board))]
+    boards = np.hstack([np.tile(np.array(board, dtype=np.int8), (len(runouts), 1)), runouts])
+    holes = [np.tile(np.array(hole, dtype=np.int8), (len(runouts), 1)) for hole in [hero] + villains]
+    strengths = player_strengths(holes, boards)
+
+    wins, ties, losses = _showdown_counts(strengths[0], strengths[1:])
+    return Equity(float(wins) / len(runouts), float(ties) / len(runouts), float(losses) / len(runouts), len(runouts))
+
+
+def _strata(hero, villains, board, remaining, stratify):
+    '''
+    Groups the candidates for the next board card into strata. With stratify the cards equal up to
+    a permutation of the suits of the known cards share a stratum, else all cards share one.
+    :return list of int8 arrays of card codes, a single None on a complete board
+    '''
+    if len(board) == 5:
+        return [None]
+    if not stratify:
+        return [remaining]
+    strata = collections.OrderedDict()
+    for code in remaining.tolist():
+        strata.setdefault(poker.canonical_form(hero, board, *(villains + [[code]])), []).append(code)
+    return [np.array(codes, dtype=np.int8) for codes in strata.values()]
+
+
+def _runout_scores(hero, villains, n_random, board, n_trials, first_cards, rng):
+    '''
+    Deals runouts whose next board card is drawn from first_cards, or any card if it is None
+    :return (N,) pot shares of the hero, 1 for a win and 1/k for a k-way tie, and (N,) booleans
+        telling whether the hero is among several tied winners
+    '''
+    boards = np.tile(np.array(board, dtype=np.intp), (n_trials, 1))
+    if first_cards is not None:
+        boards = np.hstack([boards, rng.choice(first_cards, n_trials)[:, None]])
+    n_board = 5 - boards.shape[1]
+    known = np.tile(np.array(hero + [code for villain in villains for code in villain], dtype=np.intp), (n_trials, 1))
+    dealt = batch.deal_excluding(np.hstack([known, boards]), n_board + 2 * n_random, rng)
+    boards = np.hstack([boards, dealt[:, :n_board]])
+
+    holes = [np.tile(np.array(hole, dtype=np.intp), (n_trials, 1)) for hole in [hero] + villains]
+    holes += [dealt[:, n_board + 2 * i:n_board + 2 * i + 2] for i in range(n_random)]
+    strengths = player_strengths(holes, boards)
+    best = strengths.max(axis=0)
+    winners = (strengths == best).sum(axis=0)
+    hero_wins = strengths[0] == best
+    return np.where(hero_wins, 1.0 / winners, 0.0), hero_wins & (winners > 1)
+
+
+def adaptive_equity(hero, villains=(), n_villains=None, board=(), precision=0.005, confidence=0.95,
+                    max_trials=1000000, time_budget=None, stratify=True, seed=None):
+    '''
+    Estimates the equity of the hero by dealing rounds of random runouts until the confidence
+    interval is narrow enough, max_trials runouts are dealt or the time budget is spent, so easy
+    spots stop after a few rounds. With stratify the runouts are stratified on the next board
+    card, grouped into suit-isomorphic classes, and every class gets its share of each round.
+    :param hero: the two hole cards of the hero, PlayingCard objects or card codes
+    :param villains: list of the hole cards of known opponents
+    :param n_villains: number of opponents with random hole cards, 1 if None and no villains are given
+    :param board: the 0-5 cards already on the table
+    :param precision: half width of the confidence interval to reach
+    :param confidence: confidence level of the interval
+    :param max_trials: maximum number of runouts
+    :param time_budget: maximum number of seconds, unbounded if None
+    :param stratify: if True the runouts are stratified on suit-isomorphic next board cards
+    :param seed: seed of the Generator dealing the runouts, fresh entropy if None
+    :return an AdaptiveEquity
+    '''
+    started = time.perf_counter()
+    if max_trials < 1:
+        raise ValueError('At least one trial is needed')
+    hero = hole_codes(hero, 'The hero')
+    villains = [hole_codes(villain, 'A villain') for villain in villains]
+    board = _hand_codes(board, 5, 'The board')
+    if n_villains is None:
+        n_villains = 0 if villains else 1
+    remaining = check_cards(hero, villains, board)
+    if len(remaining) < 5 - len(board) + 2 * n_villains:
+        raise ValueError('Not enough cards left in the deck')
+
+    rng = np.random.default_rng(seed)
+    z = statistics.NormalDist().inv_cdf((1 + confidence) / 2.)
+    strata = _strata(hero, villains, board, remaining, stratify)
+    weights = np.array([1.0 if cards is None else len(cards) for cards in strata]) / (
+        1 if strata[0] is None else len(remaining))
+    # Per stratum: runouts, sum and sum of squares of the pot shares, wins and ties
+    sums = np.zeros((len(strata), 5))
+    trials, round_trials = 0, MIN_TRIALS
+    while True:
+        round_trials = min(round_trials, max_trials - trials)
+        counts = np.diff(np.floor(np.concatenate([[0], np.cumsum(weights)]) * round_trials + rng.random()))
+        for index, count in enumerate(counts.astype(int)):
+            if count:
+                scores, ties = _runout_scores(hero, villains, n_villains, board, count, strata[index], rng)
+                sums[index] += [count, scores.sum(), (scores ** 2).sum(), np.count_nonzero(scores == 1), ties.sum()]
+        trials += int(counts.sum())
+        round_trials = min(2 * round_trials, CHUNK_TRIALS)
+
+        sampled = sums[:, 0] > 0
+        n, w = sums[sampled, 0], weights[sampled] / weights[sampled].sum()
+        means = sums[sampled, 1] / n
+        variances = np.maximum(sums[sampled, 2] / n - means ** 2, 0) * n / np.maximum(n - 1, 1)
+        standard_error = float(np.sqrt(np.sum(w ** 2 * variances / n)))
+        converged = z * standard_error <= precision and trials >= MIN_TRIALS
+        if converged or trials >= max_trials or time_budget is not None and time.perf_counter() - started >= time_budget:
+            break
+
+    equity = float(np.dot(w, means))
+    win = float(np.dot(w, sums[sampled, 3] / n))
+    tie = float(np.dot(w, sums[sampled, 4] / n))
+    return AdaptiveEquity(equity, max(equity - z * standard_error, 0.), min(equity + z * standard_error, 1.),
+                          standard_error, win, tie, 1 - win - tie, trials, converged)
@@ -0,0 +1,92 @@
+"""
+Packed binary files of hands. Every hand is stored as its 64 bit hand bitmask and, next to the
+masks, its int32 strength. The files are memory-mapped, so the batch evaluator runs straight over
+the mapped masks and processes share the pages instead of pickling arrays.
+"""
+import struct
+import numpy as np
+import batch
+
+
+MAGIC = b'PKHF'
+VERSION = 1
+# Flag set when the strengths section follows the masks
+HAS_STRENGTHS = 1
+_HEADER = struct.Struct('<4sHHQ')
+
+
+def _chunks(hands):
+    '''Yields the (N, k) card arrays of hands, a single array or an iterable of them'''
+    if isinstance(hands, np.ndarray):
+        yield hands
+        return
+    for chunk in hands:
+        yield np.asarray(chunk)
+
+
+def write_hands(path, hands, strengths=True):
+    '''
+    Writes hands to a packed file: a header, every hand as a little endian uint64 bitmask and, if
+    asked for, every strength as a little endian int32. The hands are streamed to the file chunk
+    by chunk and the strengths computed afterwards from the mapped masks.
+    :param path: the file to write
+    :param hands: an (N, k) array of card codes, or an iterable of such chunks, e.g. from a generator
+    :param strengths: if True the strengths are evaluated and stored
+    :return the number of hands written
+    :raises ValueError: if a hand holds the same card twice
+    '''
+    n_hands = 0
+    with open(path, 'wb') as file:
+        file.write(_HEADER.pack(MAGIC, VERSION, 0, 0))
+        for chunk in _chunks(hands):
+            masks = batch.hand_masks(chunk)
+            if not (batch.mask_sizes(masks) == chunk.shape[1]).all():
+                raise ValueError('The same card is in a hand twice')
+            file.write(masks.astype('<u8').tobytes())
+            n_hands += len(chunk)
+
+    flags = 0
+    if strengths and n_hands:
+        masks = np.memmap(path, dtype='<u8', mode='r', offset=_HEADER.size, shape=(n_hands,))
+        with open(path, 'ab') as file:
+            for start in range(0, n_hands, batch.CHUNK_SIZE):
+                file.write(batch.evaluate_masks(masks[start:start + batch.CHUNK_SIZE]).astype('<i4').tobytes())
+        del masks
+        flags |= HAS_STRENGTHS
+    with open(path, 'r+b') as file:
+        file.write(_HEADER.pack(MAGIC, VERSION, flags, n_hands))
+    return n_hands
+
+
+class HandFile(object):
+    """
+    The HandFile class memory-maps a file written by write_hands. The masks and strengths are
+    numpy memmaps, slicing them reads only the pages needed.
+    """
+    def __init__(self, path):
+        with open(path, 'rb') as file:
+            magic, version, flags, n_hands = _HEADER.unpack(file.read(_HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('%s is not a packed hand file' % path)
+        self.masks = np.zeros(0, dtype='<u8')
+        self.strengths = None
+        if n_hands:
+            self.masks = np.memmap(path, dtype='<u8', mode='r', offset=_HEADER.size, shape=(n_hands,))
+        if flags & HAS_STRENGTHS:
+            self.strengths = np.memmap(path, dtype='<i4', mode='r', offset=_HEADER.size + 8 * n_hands,
+                                       shape=(n_hands,))
+
+    def __len__(self):
+        return len(self.masks)
+
+    def cards(self, n_cards, start=0, stop=None):
+        '''
+        Decodes a slice of the hands into card codes
+        :param n_cards: number of cards in every hand of the slice
+        :return (N, n_cards) int8 array of card codes
+        '''
+        return batch.mask_cards(self.masks[start:stop], n_cards)
+
+    def evaluate(self, start=0, stop=None):
+        '''Evaluates a slice of the hands straight from the mapped masks, see batch.evaluate_masks'''
+        return batch.evaluate_masks(self.masks[start:stop])
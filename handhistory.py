@@ -0,0 +1,183 @@
+"""
+Streaming evaluation of hand-history logs. Records are read lazily in chunks of lines, every
+chunk is parsed and evaluated with the batch evaluator, in a pool of processes if asked for, and
+the results are written out before the next chunks are read, so memory stays bounded by the
+chunk size and the number of chunks in flight whatever the size of the input.
+
+Every line of the input is one hand: an optional hand id and a tab followed by the card names,
+e.g. 'hand42<TAB>As Kd | Qh Jh Th 2c 3d'. Empty lines and lines starting with '#' are skipped.
+Every output line holds the hand id, the strength, the CardCombo name and the card values of the
+best pokerhand, separated by tabs.
+"""
+import argparse
+import collections
+import itertools
+import sys
+import numpy as np
+import poker
+import batch
+import shared
+
+
+CHUNK_LINES = 1 << 14
+# Number of chunks queued per worker process
+CHUNKS_IN_FLIGHT = 2
+
+_COMBO_NAMES = [combo.name for combo in poker.CardCombo]
+
+Summary = collections.namedtuple('Summary', ['hands', 'skipped'])
+Summary.__doc__ = '''The number of hands evaluated and of invalid records skipped'''
+
+
+def parse_record(line):
+    '''
+    Parses one hand-history record
+    :param line: the record without its line break, an optional hand id and a tab followed by card names
+    :return the hand id, '' if there is none, and the list of card codes
+    :raises ValueError: if a card name is not valid, a card is repeated or there are no cards
+    '''
+    hand_id, _, names = line.rpartition('\t')
+    codes = poker.parse_cards(names)
+    if not codes:
+        raise ValueError('No cards in record')
+    if len(set(codes)) != len(codes):
+        raise ValueError('The same card is dealt twice')
+    return hand_id, codes
+
+
+def evaluate_records(hands):
+    '''
+    Computes the strengths of hands with any number of cards, the hands of up to 7 cards are
+    evaluated in one batch per number of cards
+    :param hands: list of lists of card codes
+    :return list of strengths, see poker.evaluate
+    '''
+    strengths = [0] * len(hands)
+    sizes = collections.defaultdict(list)
+    for index, codes in enumerate(hands):
+        sizes[len(codes)].append(index)
+    for size, indices in sizes.items():
+        if size > 7:
+            for index in indices:
+                strengths[index] = poker.evaluate(hands[index])
+            continue
+        cards = np.array([hands[index] for index in indices], dtype=np.int8)
+        for index, strength in zip(indices, batch.evaluate_batch(cards).tolist()):
+            strengths[index] = strength
+    return strengths
+
+
+def format_result(hand_id, strength):
+    '''Returns the output line of a hand, with the same card_combo and card_values as best_poker_hand'''
+    return '%s\t%d\t%s\t%s\n' % (hand_id, strength, _COMBO_NAMES[strength >> poker.STRENGTH_SHIFT],
+                                 ' '.join(map(str, poker.strength_values(strength))))
+
+
+def process_chunk(job):
+    '''
+    Parses and evaluates a chunk of lines, the work of a single process
+    :param job: tuple of the number of the first line, the list of lines and whether invalid records are skipped
+    :return the output text, the number of hands and the number of skipped records
+    :raises ValueError: for an invalid record, with its line number, unless these are skipped
+    '''
+    first_line, lines, skip_invalid = job
+    hand_ids, hands = [], []
+    skipped = 0
+    for number, line in enumerate(lines, first_line):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        try:
+            hand_id, codes = parse_record(line)
+        except ValueError as error:
+            if not skip_invalid:
+                raise ValueError('Line %d: %s' % (number, error))
+            skipped += 1
+            continue
+        hand_ids.append(hand_id or str(number))
+        hands.append(codes)
+    strengths = evaluate_records(hands)
+    return ''.join(format_result(*result) for result in zip(hand_ids, strengths)), len(hands), skipped
+
+
+def read_chunks(lines, chunk_lines=CHUNK_LINES, skip_invalid=False):
+    '''
+    Lazily splits an iterable of lines, e.g. an open file, into jobs for process_chunk
+    :param chunk_lines: number of lines per chunk
+    '''
+    lines = iter(lines)
+    first_line = 1
+    while True:
+        chunk = list(itertools.islice(lines, chunk_lines))
+        if not chunk:
+            return
+        yield first_line, chunk, skip_invalid
+        first_line += len(chunk)
+
+
+def process(lines, out, chunk_lines=CHUNK_LINES, processes=1, skip_invalid=False, tables=None):
+    '''
+    Evaluates a stream of hand-history records and writes the results incrementally, in the order
+    of the input. With a pool at most CHUNKS_IN_FLIGHT chunks per process are read ahead.
+    :param lines: iterable of records, e.g. an open file
+    :param out: text stream the results are written to
+    :param chunk_lines: number of lines parsed and evaluated at once
+    :param processes: number of worker processes, no pool if 1
+    :param skip_invalid: if True invalid records are counted and skipped, else they raise ValueError
+    :param tables: the shared.SharedTables of the workers, created for the call if None
+    :return a Summary
+    '''
+    chunks = read_chunks(lines, chunk_lines, skip_invalid)
+    if processes <= 1:
+        return _write_results(map(process_chunk, chunks), out)
+    with shared.pool(processes, tables) as pool:
+        return _write_results(_pool_results(pool, chunks, processes * CHUNKS_IN_FLIGHT), out)
+
+
+def _pool_results(pool, jobs, limit):
+    '''Yields the results of process_chunk in the order of the jobs, with at most limit jobs submitted ahead'''
+    pending = collections.deque()
+    for job in jobs:
+        pending.append(pool.apply_async(process_chunk, (job,)))
+        if len(pending) >= limit:
+            yield pending.popleft().get()
+    while pending:
+        yield pending.popleft().get()
+
+
+def _write_results(results, out):
+    hands = skipped = 0
+    for text, chunk_hands, chunk_skipped in results:
+        out.write(text)
+        hands += chunk_hands
+        skipped += chunk_skipped
+    return Summary(hands, skipped)
+
+
+def process_file(input_path, output_path, chunk_lines=CHUNK_LINES, processes=1, skip_invalid=False):
+    '''Evaluates a hand-history file into an output file, see process. A path of '-' is stdin or stdout.'''
+    source = sys.stdin if input_path == '-' else open(input_path)
+    target = sys.stdout if output_path == '-' else open(output_path, 'w')
+    try:
+        return process(source, target, chunk_lines, processes, skip_invalid)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if target is not sys.stdout:
+            target.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Evaluates the hands of a hand-history log.')
+    parser.add_argument('input', help="hand-history file, '-' for stdin")
+    parser.add_argument('output', nargs='?', default='-', help="result file, stdout by default")
+    parser.add_argument('--chunk-lines', type=int, default=CHUNK_LINES, help='lines evaluated at once')
+    parser.add_argument('--processes', type=int, default=1, help='worker processes')
+    parser.add_argument('--skip-invalid', action='store_true', help='skip invalid records instead of stopping')
+    args = parser.parse_args(argv)
+    summary = process_file(args.input, args.output, args.chunk_lines, args.processes, args.skip_invalid)
+    sys.stderr.write('%d hands evaluated, %d invalid records skipped\n' % summary)
+
+
+if __name__ == '__main__':
+    main()
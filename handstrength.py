@@ -0,0 +1,323 @@
+"""
+Expected hand strength of every hole card pair on the boards of a street, and buckets of the
+hands with similar strength distributions. The hand strength of a pair on a complete board is the
+fraction of the opponent pairs it beats, ties counted as half, see boardtable.hand_strengths. On
+a flop or a turn all runouts are enumerated: EHS is the mean of the hand strength over the
+runouts, EHS2 the mean of its square and the histogram its distribution.
+
+Boards equal up to a permutation of the suits have the same strengths, so one canonical board of
+every class is computed, weighted by the size of its class. The boards are split into chunks
+computed in a pool of processes, and every chunk is saved to a cache directory as soon as it is
+done, so a run that is stopped resumes with the chunks not saved yet.
+
+    python handstrength.py flop ehs-cache --buckets 50
+"""
+import argparse
+import collections
+import json
+import os
+import sys
+import numpy as np
+import poker
+import batch
+import boardtable
+import shared
+
+
+STREETS = {'flop': 3, 'turn': 4, 'river': 5}
+# Number of bins of the hand strength histograms
+N_BINS = 20
+# Number of boards computed and saved at once
+CHUNK_BOARDS = 32
+# Number of hands assigned to the buckets at once
+BUCKET_ROWS = 1 << 16
+
+_SUIT_SHIFTS = np.arange(poker.N_SUITS, dtype=np.uint64) * np.uint64(poker.N_RANKS)
+
+StreetStrengths = collections.namedtuple('StreetStrengths', ['boards', 'weights', 'ehs', 'ehs2', 'histograms'])
+StreetStrengths.__doc__ = '''The canonical boards of a street and the number of boards each stands for, and per board
+the (C(52, 2),) EHS and EHS2 of every pair of boardtable.PAIRS, nan for the pairs sharing a card with the
+board, and the (C(52, 2), bins) histograms of their hand strength over the runouts'''
+
+Buckets = collections.namedtuple('Buckets', ['centers', 'labels', 'inertia'])
+Buckets.__doc__ = '''The (k, bins) cumulative histograms at the center of every bucket, the (boards, C(52, 2)) bucket
+of every pair, -1 for the pairs sharing a card with the board, and the weighted sum of squared distances'''
+
+
+def _suit_maps(cards):
+    '''
+    Orders the suits of every row of cards by the ranks they hold, the suit holding the highest
+    ranks first, so rows equal up to a permutation of the suits get the same order
+    :return (N, 4) array mapping every suit to its canonical suit
+    '''
+    masks = batch.hand_masks(cards)
+    signatures = (masks[:, None] >> _SUIT_SHIFTS) & np.uint64((1 << poker.N_RANKS) - 1)
+    order = np.argsort(-signatures.astype(np.int64), axis=1, kind='stable')
+    maps = np.empty_like(order)
+    np.put_along_axis(maps, order, np.arange(poker.N_SUITS), axis=1)
+    return maps
+
+
+def _relabel(cards, maps):
+    '''Returns the cards of every row with their suits mapped by the (N, 4) suit maps of the rows'''
+    cards = np.asarray(cards, dtype=np.intp)
+    suits = np.take_along_axis(maps, cards // poker.N_RANKS, axis=1)
+    return (cards % poker.N_RANKS + poker.N_RANKS * suits).astype(np.int8)
+
+
+def street_boards(n_board):
+    '''
+    Lists the canonical boards of n_board cards, one per class of boards equal up to a
+    permutation of the suits, e.g. 1755 flops
+    :return (B, n_board) int8 array of boards in increasing order of their hand bitmasks, and the
+        (B,) number of boards of every class
+    '''
+    boards = batch.combinations(poker.N_CARDS, n_board).astype(np.int8)
+    masks = np.concatenate([batch.hand_masks(_relabel(part, _suit_maps(part)))
+                            for part in np.array_split(boards, max(1, len(boards) >> 18))])
+    masks, weights = np.unique(masks, return_counts=True)
+    return batch.mask_cards(masks, n_board), weights
+
+
+def board_strengths(board, n_bins=N_BINS):
+    '''
+    Computes the hand strength distribution of every hole card pair on a board over all its runouts
+    :param board: the 3-5 cards on the table, as card codes
+    :param n_bins: number of bins of the histograms
+    :return the (C(52, 2),) float32 EHS and EHS2, nan for the pairs sharing a card with the
+        board, and the (C(52, 2), n_bins) uint16 histograms
+    '''
+    board = list(board)
+    remaining = batch.live_cards(board)
+    runouts = remaining[batch.combinations(len(remaining), 5 - len(board))]
+    strengths = boardtable.hand_strengths(np.hstack([np.tile(np.array(board, dtype=np.int8), (len(runouts), 1)),
+                                                     runouts]))
+    valid = ~np.isnan(strengths)
+    strengths = np.where(valid, strengths, 0.0)
+    counts = valid.sum(axis=0)
+    with np.errstate(invalid='ignore'):
+        ehs = strengths.sum(axis=0) / counts
+        ehs2 = (strengths ** 2).sum(axis=0) / counts
+    bins = np.minimum((strengths * n_bins).astype(np.intp), n_bins - 1)
+    pairs = np.broadcast_to(np.arange(len(boardtable.PAIRS)), strengths.shape)
+    histograms = np.bincount((pairs * n_bins + bins)[valid], minlength=len(boardtable.PAIRS) * n_bins)
+    return ehs.astype(np.float32), ehs2.astype(np.float32), histograms.reshape(-1, n_bins).astype(np.uint16)
+
+
+def compute_chunk(job):
+    '''
+    Computes the strengths of a chunk of boards, the work of a single process
+    :param job: tuple of the chunk index, the (N, n_board) boards and the number of bins
+    :return the chunk index and the (N, C(52, 2)) EHS, EHS2 and (N, C(52, 2), bins) histograms
+    '''
+    index, boards, n_bins = job
+    results = [board_strengths(board, n_bins) for board in boards.tolist()]
+    return (index,) + tuple(np.stack(arrays) for arrays in zip(*results))
+
+
+def _chunk_path(directory, index):
+    return os.path.join(directory, 'chunk-%05d.npz' % index)
+
+
+def _street_directory(cache_dir, street, n_bins, chunk_boards, n_boards):
+    '''Creates or checks the cache directory of a street, whose chunks are only valid for the same settings'''
+    directory = os.path.join(cache_dir, street)
+    meta = {'street': street, 'n_bins': n_bins, 'chunk_boards': chunk_boards, 'n_boards': n_boards}
+    path = os.path.join(directory, 'meta.json')
+    if os.path.exists(path):
+        with open(path) as file:
+            if json.load(file) != meta:
+                raise ValueError('%s holds strengths computed with other settings' % directory)
+    else:
+        os.makedirs(directory, exist_ok=True)
+        with open(path, 'w') as file:
+            json.dump(meta, file)
+    return directory
+
+
+def compute(street, cache_dir, processes=None, n_bins=N_BINS, chunk_boards=CHUNK_BOARDS, stop=None, progress=None,
+            tables=None):
+    '''
+    Computes the strengths of the canonical boards of a street into a cache directory, skipping
+    the chunks saved by an earlier run. Every chunk is written to a temporary file and renamed,
+    so a stopped run never leaves a partial chunk behind.
+    :param street: 'flop', 'turn' or 'river'
+    :param cache_dir: the directory holding the cache of every street
+    :param processes: number of worker processes, all cores if None, no pool if 1
+    :param n_bins: number of bins of the histograms
+    :param chunk_boards: number of boards per chunk
+    :param stop: number of canonical boards to compute, all if None
+    :param progress: function called with the numbers of chunks done and in total after every chunk
+    :param tables: the shared.SharedTables of the workers, created for the call if None
+    :return the number of chunks computed by this call
+    '''
+    boards, weights = street_boards(STREETS[street])
+    directory = _street_directory(cache_dir, street, n_bins, chunk_boards, len(boards))
+    n_chunks = -(-min(len(boards) if stop is None else stop, len(boards)) // chunk_boards)
+    jobs = [(index, boards[index * chunk_boards:(index + 1) * chunk_boards], n_bins) for index in range(n_chunks)
+            if not os.path.exists(_chunk_path(directory, index))]
+    if processes is None:
+        processes = os.cpu_count() or 1
+
+    def save(results):
+        done = n_chunks - len(jobs)
+        for index, ehs, ehs2, histograms in results:
+            start = index * chunk_boards
+            temporary = os.path.join(directory, 'chunk-%05d.tmp.npz' % index)
+            np.savez(temporary, boards=boards[start:start + len(ehs)], weights=weights[start:start + len(ehs)],
+                     ehs=ehs, ehs2=ehs2, histograms=histograms)
+            os.replace(temporary, _chunk_path(directory, index))
+            done += 1
+            if progress is not None:
+                progress(done, n_chunks)
+
+    if processes <= 1 or len(jobs) <= 1:
+        save(map(compute_chunk, jobs))
+    else:
+        with shared.pool(processes, tables, n_cards=(7,)) as pool:
+            save(pool.imap_unordered(compute_chunk, jobs))
+    return len(jobs)
+
+
+def load(cache_dir, street):
+    '''
+    Loads the chunks of a street saved in a cache directory
+    :return a StreetStrengths of the boards of the saved chunks
+    :raises ValueError: if no chunk is saved
+    '''
+    directory = os.path.join(cache_dir, street)
+    names = sorted(name for name in os.listdir(directory) if name.startswith('chunk-') and
+                   not name.endswith('.tmp.npz')) if os.path.isdir(directory) else []
+    if not names:
+        raise ValueError('No strengths of the %s are saved in %s' % (street, cache_dir))
+    chunks = []
+    for name in names:
+        with np.load(os.path.join(directory, name)) as chunk:
+            chunks.append([chunk[field] for field in StreetStrengths._fields])
+    return StreetStrengths(*(np.concatenate(arrays) for arrays in zip(*chunks)))
+
+
+def lookup(strengths, board, hole):
+    '''
+    Finds the strengths of hole cards on any board, through the canonical board of its class
+    :param strengths: a StreetStrengths holding the canonical board
+    :param board: the cards on the table
+    :param hole: the two hole cards
+    :return the EHS, the EHS2 and the histogram of the hole cards
+    :raises ValueError: if the canonical board is not in strengths or the hole cards are not valid
+    '''
+    board = np.array([poker.card_codes(board)])
+    maps = _suit_maps(board)
+    mask = batch.hand_masks(_relabel(board, maps))[0]
+    masks = batch.hand_masks(strengths.boards)
+    index = np.searchsorted(masks, mask)
+    if index == len(masks) or masks[index] != mask:
+        raise ValueError('The board is not among the computed boards')
+    first, second = _relabel(np.array([poker.card_codes(hole)]), maps)[0].tolist()
+    pair = boardtable.PAIR_INDEX[first, second]
+    if pair < 0 or np.isnan(strengths.ehs[index, pair]):
+        raise ValueError('The hole cards must be two different cards not on the board')
+    return float(strengths.ehs[index, pair]), float(strengths.ehs2[index, pair]), strengths.histograms[index, pair]
+
+
+def _features(histograms):
+    '''Returns the cumulative distributions of histograms, whose euclidean distance compares like the earth mover's distance'''
+    histograms = histograms.astype(np.float64)
+    return np.cumsum(histograms, axis=-1) / histograms.sum(axis=-1, keepdims=True)
+
+
+def _valid_rows(strengths, start, stop):
+    '''Returns the features, the weights and the validity mask of the pairs of a range of boards'''
+    valid = ~np.isnan(strengths.ehs[start:stop])
+    features = _features(strengths.histograms[start:stop][valid])
+    weights = np.broadcast_to(strengths.weights[start:stop, None], valid.shape)[valid].astype(np.float64)
+    return features, weights, valid
+
+
+def _assign(features, centers):
+    '''Returns the nearest center of every row and its squared distance'''
+    distances = (features ** 2).sum(axis=1)[:, None] - 2 * features @ centers.T + (centers ** 2).sum(axis=1)[None]
+    labels = distances.argmin(axis=1)
+    return labels, np.maximum(distances[np.arange(len(labels)), labels], 0)
+
+
+def _initial_centers(strengths, k, sample, rng):
+    '''Picks k centers with k-means++ among a sample of the pairs, drawn in proportion to the board weights'''
+    boards = rng.choice(len(strengths.boards), size=sample, p=strengths.weights / strengths.weights.sum())
+    pairs = rng.integers(len(boardtable.PAIRS), size=sample)
+    valid = ~np.isnan(strengths.ehs[boards, pairs])
+    features = _features(strengths.histograms[boards[valid], pairs[valid]])
+    if len(features) < k:
+        raise ValueError('Not enough hands for %d buckets' % k)
+    centers = [features[rng.integers(len(features))]]
+    distances = ((features - centers[0]) ** 2).sum(axis=1)
+    for _ in range(k - 1):
+        total = distances.sum()
+        index = rng.choice(len(features), p=distances / total) if total > 0 else rng.integers(len(features))
+        centers.append(features[index])
+        distances = np.minimum(distances, ((features - features[index]) ** 2).sum(axis=1))
+    return np.array(centers)
+
+
+def bucket(strengths, k, iterations=20, seed=None, sample=1 << 14):
+    '''
+    Clusters the pairs of all boards into k buckets of similar hand strength histograms with
+    k-means, weighted by the number of boards every canonical board stands for. The centers are
+    picked with k-means++ among a sample, and the pairs are then assigned a range of boards at a
+    time, so memory stays bounded whatever the number of boards.
+    :param strengths: a StreetStrengths
+    :param k: number of buckets
+    :param iterations: maximum number of k-means iterations, they stop early when no pair moves
+    :param seed: seed of the Generator picking the initial centers
+    :param sample: number of pairs drawn for the initial centers
+    :return a Buckets
+    '''
+    rng = np.random.default_rng(seed)
+    centers = _initial_centers(strengths, k, sample, rng)
+    labels = np.full(strengths.ehs.shape, -1, dtype=np.int16)
+    step = max(1, BUCKET_ROWS // len(boardtable.PAIRS))
+    for _ in range(iterations):
+        sums, totals = np.zeros_like(centers), np.zeros(k)
+        moved = inertia = 0
+        for start in range(0, len(strengths.boards), step):
+            features, weights, valid = _valid_rows(strengths, start, start + step)
+            chunk_labels, distances = _assign(features, centers)
+            moved += np.count_nonzero(labels[start:start + step][valid] != chunk_labels)
+            labels[start:start + step][valid] = chunk_labels
+            inertia += np.dot(weights, distances)
+            np.add.at(sums, chunk_labels, features * weights[:, None])
+            totals += np.bincount(chunk_labels, weights=weights, minlength=k)
+        filled = totals > 0
+        centers[filled] = sums[filled] / totals[filled, None]
+        if not moved:
+            break
+    return Buckets(centers, labels, float(inertia))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Computes the expected hand strengths of a street and buckets them.')
+    parser.add_argument('street', choices=sorted(STREETS, key=STREETS.get))
+    parser.add_argument('cache', help='directory the strengths are saved to and resumed from')
+    parser.add_argument('--processes', type=int, default=None, help='worker processes, all cores by default')
+    parser.add_argument('--bins', type=int, default=N_BINS, help='bins of the hand strength histograms')
+    parser.add_argument('--chunk-boards', type=int, default=CHUNK_BOARDS, help='boards computed and saved at once')
+    parser.add_argument('--stop', type=int, default=None, help='number of canonical boards to compute')
+    parser.add_argument('--buckets', type=int, default=None, help='number of buckets, no bucketing by default')
+    parser.add_argument('--iterations', type=int, default=20, help='maximum number of k-means iterations')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args(argv)
+
+    def progress(done, total):
+        sys.stderr.write('\r%d/%d chunks' % (done, total))
+        sys.stderr.flush()
+    compute(args.street, args.cache, args.processes, args.bins, args.chunk_boards, args.stop, progress)
+    sys.stderr.write('\n')
+    if args.buckets:
+        result = bucket(load(args.cache, args.street), args.buckets, args.iterations, args.seed)
+        path = os.path.join(args.cache, args.street, 'buckets-%d.npz' % args.buckets)
+        np.savez(path, centers=result.centers, labels=result.labels)
+        sys.stderr.write('%d buckets saved to %s, inertia %g\n' % (args.buckets, path, result.inertia))
+
+
+if __name__ == '__main__':
+    main()
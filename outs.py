@@ -0,0 +1,59 @@
+"""
+Outs of a spot on the flop or the turn. All unseen next cards, or all turn and river pairs of a
+flop, are dealt and every player is evaluated on all of them in one batch, giving the CardCombo
+transitions of the hero and of the opponents and the cards that flip the showdown.
+"""
+import collections
+import numpy as np
+import poker
+import batch
+import equity
+
+
+Outs = collections.namedtuple('Outs', ['cards', 'combo', 'combos', 'improved', 'villain_combos', 'villains_after',
+                                       'villains_improved', 'share', 'shares', 'flips', 'to_win', 'to_loss'])
+Outs.__doc__ = '''The next cards analysed, one row per card or pair of cards, and per row of cards:
+the CardCombo of the hero before and after and whether it improved, the CardCombo of every villain
+before and after and whether it improved, the pot share of the hero before and after, 1 for a win
+and 1/k for a k-way tie, +1 where the cards make the hero the only winner, -1 where they make the
+hero lose a pot it won or tied, and the numbers of rows flipping to a win and to a loss'''
+
+
+def _pot_shares(strengths):
+    '''Returns the pot shares of the first player from (players, ...) strengths'''
+    best = strengths.max(axis=0)
+    winners = (strengths == best).sum(axis=0)
+    return np.where(strengths[0] == best, 1.0 / winners, 0.0)
+
+
+def next_cards(hero, board, villains=(), n_cards=1):
+    '''
+    Analyses every unseen next card, or every pair of turn and river cards, of a spot in one batch
+    :param hero: the hole cards of the hero, PlayingCard objects or card codes
+    :param board: the flop or the turn
+    :param villains: list of the hole cards of the opponents, the showdown is only decided against them
+    :param n_cards: number of cards dealt, 1 for the next card, 2 for the turn and river of a flop
+    :return an Outs
+    :raises ValueError: if the board is not a flop or a turn, too many cards are dealt or a card is dealt twice
+    '''
+    hero = equity.hole_codes(hero, 'The hero')
+    villains = [equity.hole_codes(villain, 'A villain') for villain in villains]
+    board = poker.card_codes(board)
+    if len(board) not in (3, 4):
+        raise ValueError('The board must be a flop or a turn')
+    if not 1 <= n_cards <= 5 - len(board):
+        raise ValueError('Only %d cards are left to deal' % (5 - len(board)))
+    remaining = equity.check_cards(hero, villains, board)
+
+    cards = remaining[batch.combinations(len(remaining), n_cards)]
+    boards = np.hstack([np.tile(np.array(board, dtype=np.int8), (len(cards), 1)), cards])
+    holes = [np.array([hole], dtype=np.int8) for hole in [hero] + villains]
+    before = equity.player_strengths(holes, np.array([board], dtype=np.int8))[:, 0]
+    after = equity.player_strengths([np.repeat(hole, len(cards), axis=0) for hole in holes], boards)
+
+    combos_before, combos_after = before >> poker.STRENGTH_SHIFT, after >> poker.STRENGTH_SHIFT
+    share, shares = float(_pot_shares(before[:, None])[0]), _pot_shares(after)
+    flips = np.where((shares == 1) & (share < 1), 1, 0) - np.where((shares == 0) & (share > 0), 1, 0)
+    return Outs(cards, int(combos_before[0]), combos_after[0], combos_after[0] > combos_before[0],
+                combos_before[1:], combos_after[1:].T, (combos_after[1:] > combos_before[1:, None]).T,
+                share, shares, flips, int(np.count_nonzero(flips > 0)), int(np.count_nonzero(flips < 0)))
@@ -1,4 +1,9 @@
-import numpy as np
+import collections
+import functools
+import importlib
+import itertools
+import numbers
+import time
 from enum import Enum
 from enum import IntEnum
 from abc import ABC, abstractmethod
@@ -51,16 +56,45 @@ class CardCombo(IntEnum):
     fourofakind = 7
     straightflush = 8
 
+@functools.total_ordering
 class PlayingCard(ABC):
     """
-    Here a playingcard class is defined to be comparable.
+    Here a playingcard class is defined to be comparable. There are exactly 52 playingcards: the
+    constructors of the subclasses return the same immutable instance for the same value and suit.
+    Cards are equal and hash by their code, and are ordered by key, by value and then suit.
     """
+    __slots__ = ('value', 'suit', 'code', 'key', 'uni', 'symbol')
 
     def __lt__(self, other):
-        return self.value < other.value
+        if not isinstance(other, PlayingCard):
+            return NotImplemented
+        return self.key < other.key
 
     def __eq__(self, other):
-        return self.value == other.value
+        return isinstance(other, PlayingCard) and self.code == other.code
+
+    def __hash__(self):
+        return self.code
+
+    def __setattr__(self, name, value):
+        raise AttributeError('PlayingCard objects are immutable')
+
+    def __reduce__(self):
+        return decode_card, (self.code,)
+
+    @classmethod
+    def _intern(cls, value, suit, symbol):
+        '''Returns the card with the value and suit, creating it the first time'''
+        code = encode_card(value, suit)
+        card = _CARDS[code]
+        if card is None:
+            card = object.__new__(cls)
+            for name, attribute in (('value', value), ('suit', Suit(suit)), ('code', code),
+                                    ('key', (value - 2) * N_SUITS + Suit(suit).value),
+                                    ('uni', cls.Uni[Suit(suit).value]), ('symbol', symbol)):
+                object.__setattr__(card, name, attribute)
+            _CARDS[code] = card
+        return card
 
     @abstractmethod
     def give_value(self):
@@ -76,12 +110,12 @@ class NumberedCard(PlayingCard):
     """
     In this class the playingcards without a suit are represented.
     """
-    def __init__(self, value, suit):
-        super().__init__()
-        self.value = value
-        self.suit = suit
-        self.uni = self.Uni[suit.value]
-        self.symbol = str(value)
+    __slots__ = ()
+
+    def __new__(cls, value, suit):
+        if not 2 <= value <= 10:
+            raise ValueError('A NumberedCard has a value from 2 to 10')
+        return cls._intern(value, suit, str(value))
 
     def give_value(self):
         return self.value
@@ -91,12 +125,10 @@ class JackCard(PlayingCard):
     """
     The JackCard class represents the jack card
     """
-    def __init__(self, suit):
-        super().__init__()
-        self.suit = suit
-        self.value = 11
-        self.uni = self.Uni[suit.value]
-        self.symbol = 'J'
+    __slots__ = ()
+
+    def __new__(cls, suit):
+        return cls._intern(11, suit, 'J')
 
     def give_value(self):
         return self.value
@@ -106,12 +138,10 @@ class QueenCard(PlayingCard):
     """
     The QueenCard class represents the queen card.
     """
-    def __init__(self, suit):
-        super().__init__()
-        self.suit = suit
-        self.value = 12
-        self.uni = self.Uni[suit.value]
-        self.symbol = 'Q'
+    __slots__ = ()
+
+    def __new__(cls, suit):
+        return cls._intern(12, suit, 'Q')
 
     def give_value(self):
         return self.value
@@ -121,12 +151,10 @@ class KingCard(PlayingCard):
     """
     The KingCard class represents the king card.
     """
-    def __init__(self, suit):
-        super().__init__()
-        self.suit = suit
-        self.value = 13
-        self.uni = self.Uni[suit.value]
-        self.symbol = 'K'
+    __slots__ = ()
+
+    def __new__(cls, suit):
+        return cls._intern(13, suit, 'K')
 
     def give_value(self):
         return self.value
@@ -136,154 +164,654 @@ class AceCard(PlayingCard):
     """
     The AceCard class represents the ace card.
     """
-    def __init__(self, suit):
-        super().__init__()
-        self.suit = suit
-        self.value = 14
-        self.uni = self.Uni[suit.value]
-        self.symbol = 'A'
+    __slots__ = ()
+
+    def __new__(cls, suit):
+        return cls._intern(14, suit, 'A')
 
     def give_value(self):
         return self.value
 
 
+N_RANKS = 13
+N_SUITS = 4
+N_CARDS = N_RANKS * N_SUITS
+
+
+def encode_card(value, suit):
+    '''
+    Encodes a card as a small integer. The cards are numbered suit by suit, so the ranks of
+    one suit occupy 13 consecutive bits of a hand bitmask.
+    :param value: the value of the card, 2-14
+    :param suit: a Suit or its integer value
+    :return an int in 0-51, (value - 2) + 13 * suit
+    '''
+    if isinstance(suit, Suit):
+        suit = suit.value
+    return (value - 2) + N_RANKS * suit
+
+
+def card_value(code):
+    '''Returns the value, 2-14, of an encoded card'''
+    return code % N_RANKS + 2
+
+
+def card_suit(code):
+    '''Returns the Suit of an encoded card'''
+    return Suit(code // N_RANKS)
+
+
+def card_mask(code):
+    '''Returns the single-bit mask of an encoded card'''
+    return 1 << code
+
+
+def hand_mask(codes):
+    '''
+    Builds the bitmask of a set of encoded cards
+    :param codes: iterable of card codes
+    :return an int with bit `code` set for every card, fits in an uint64
+    '''
+    mask = 0
+    for code in codes:
+        mask |= 1 << code
+    return mask
+
+
+def mask_codes(mask):
+    '''Returns the card codes set in a hand bitmask, in increasing order'''
+    codes = []
+    while mask:
+        low = mask & -mask
+        codes.append(low.bit_length() - 1)
+        mask ^= low
+    return codes
+
+
+def decode_card(code):
+    '''
+    Returns the PlayingCard view of an encoded card
+    :param code: a card code, 0-51
+    :return the interned PlayingCard object
+    '''
+    return _CARDS[int(code)]
+
+
+def card_codes(cards):
+    '''
+    Converts cards to their integer encoding
+    :param cards: a single PlayingCard or card code, or an iterable of them
+    :return a list of card codes
+    '''
+    if isinstance(cards, (PlayingCard, numbers.Integral)):
+        cards = [cards]
+    return [card.code if isinstance(card, PlayingCard) else int(card) for card in cards]
+
+
+# Card names are a rank character followed by a suit character, e.g. 'As' or 'Td'
+RANK_CHARS = '23456789TJQKA'
+SUIT_CHARS = 'hdsc'
+_CARD_NAMES = {rank + suit: RANK_CHARS.index(rank) + N_RANKS * SUIT_CHARS.index(suit)
+               for rank in RANK_CHARS for suit in SUIT_CHARS}
+
+
+def parse_card(name):
+    '''
+    Returns the code of a card name such as 'As', 'Td' or '2c'
+    :raises ValueError: if the name is not a card
+    '''
+    try:
+        return _CARD_NAMES[name]
+    except KeyError:
+        raise ValueError('Invalid card name %r' % name)
+
+
+def parse_cards(text):
+    '''
+    Returns the codes of the card names in a string such as 'As Kd' or 'AsKd', the names may be
+    separated by whitespace, commas or '|'
+    :raises ValueError: if a name is not a card
+    '''
+    tokens = text.replace(',', ' ').replace('|', ' ').split()
+    try:
+        return [_CARD_NAMES[token] for token in tokens]
+    except KeyError:
+        return [parse_card(token[i:i + 2]) for token in tokens for i in range(0, len(token), 2)]
+
+
+def card_name(code):
+    '''Returns the name, e.g. 'As', of an encoded card'''
+    return RANK_CHARS[code % N_RANKS] + SUIT_CHARS[code // N_RANKS]
+
+
+_CARDS = [None] * N_CARDS
+for _suit in Suit:
+    for _value in range(2, 11):
+        NumberedCard(_value, _suit)
+    JackCard(_suit)
+    QueenCard(_suit)
+    KingCard(_suit)
+    AceCard(_suit)
+del _suit, _value
+
+
+# The strength of a hand is the CardCombo in the bits above STRENGTH_SHIFT followed by up to five
+# card values, one per 4 bit nibble, highest nibble first. A higher strength is a better hand.
+STRENGTH_SHIFT = 20
+
+# Additive keys of the 13 ranks. The key sums of all rank multisets with the same number of cards,
+# at most 7 and at most 4 of each rank, are unique and index the rank tables.
+RANK_KEYS = (0, 1, 5, 22, 98, 453, 2031, 8698, 22854, 83661, 262349, 636345, 1479181)
+_CARD_KEYS = RANK_KEYS * N_SUITS
+_RANK_TABLES = {}
+_FLUSH_TABLE = []
+
+
+def pack_strength(card_combo, card_values):
+    '''
+    Packs a CardCombo and its highest cards into a single integer strength
+    :param card_combo: the CardCombo of the hand
+    :param card_values: list of at most five card values, the most significant first
+    :return the strength as an int
+    '''
+    strength = int(card_combo)
+    for i in range(5):
+        strength = strength << 4 | (card_values[i] if i < len(card_values) else 0)
+    return strength
+
+
+def strength_combo(strength):
+    '''Returns the CardCombo of a strength'''
+    return CardCombo(strength >> STRENGTH_SHIFT)
+
+
+def strength_values(strength):
+    '''Returns the list of highest card values of a strength'''
+    card_values = []
+    for shift in range(16, -1, -4):
+        value = strength >> shift & 0xF
+        if value:
+            card_values.append(value)
+    return card_values
+
+
+def _straight_high(rank_mask):
+    '''
+    Finds the highest straight in a 13 bit rank mask
+    :return the value of the highest card in the straight, 0 if there is none
+    '''
+    values = rank_mask << 1 | rank_mask >> 12
+    for value in range(14, 4, -1):
+        window = 0x1F << (value - 5)
+        if values & window == window:
+            return value
+    return 0
+
+
+def _mask_values(rank_mask):
+    '''Returns the card values in a 13 bit rank mask, highest first'''
+    return [rank + 2 for rank in range(N_RANKS - 1, -1, -1) if rank_mask >> rank & 1]
+
+
+def _flush_strength(rank_mask):
+    '''Returns the strength of the cards of a single suit, 0 if there are less than five'''
+    card_values = _mask_values(rank_mask)
+    if len(card_values) < 5:
+        return 0
+    high = _straight_high(rank_mask)
+    if high:
+        return pack_strength(CardCombo.straightflush, [high])
+    return pack_strength(CardCombo.flush, card_values[:5])
+
+
+def _count_strength(rank_count):
+    '''
+    Computes the strength of a hand ignoring the suits
+    :param rank_count: list with how many of each rank, 2 to ace, is in the hand
+    :return the strength as an int
+    '''
+    by_count = ([], [], [], [], [])
+    rank_mask = 0
+    for rank in range(N_RANKS - 1, -1, -1):
+        by_count[min(rank_count[rank], 4)].append(rank + 2)
+        if rank_count[rank]:
+            rank_mask |= 1 << rank
+    singles, pairs, trips, quads = by_count[1:]
+
+    if quads:
+        rest = sorted(singles + pairs + trips + quads[1:], reverse=True)
+        return pack_strength(CardCombo.fourofakind, quads[:1] + rest[:1])
+    if trips and len(trips) + len(pairs) >= 2:
+        rest = sorted(trips[1:] + pairs, reverse=True)
+        return pack_strength(CardCombo.fullhouse, [trips[0], rest[0]])
+    high = _straight_high(rank_mask)
+    if high:
+        return pack_strength(CardCombo.straight, [high])
+    if trips:
+        return pack_strength(CardCombo.threeofakind, trips[:1] + singles[:2])
+    if len(pairs) >= 2:
+        rest = sorted(pairs[2:] + singles, reverse=True)
+        return pack_strength(CardCombo.twopair, pairs[:2] + rest[:1])
+    if pairs:
+        return pack_strength(CardCombo.onepair, pairs[:1] + singles[:3])
+    return pack_strength(CardCombo.highcard, singles[:5])
+
+
+def rank_table(n_cards):
+    '''
+    Returns the table from rank key sum to strength for hands of n_cards cards, without flushes.
+    The table is built on first use.
+    :param n_cards: number of cards in the hand, 1-7
+    :return a dict from key sum to strength
+    '''
+    table = _RANK_TABLES.get(n_cards)
+    if table is None:
+        table = {}
+        for ranks in itertools.combinations_with_replacement(range(N_RANKS), n_cards):
+            rank_count = [0] * N_RANKS
+            for rank in ranks:
+                rank_count[rank] += 1
+            if max(rank_count) <= 4:
+                table[sum(RANK_KEYS[rank] for rank in ranks)] = _count_strength(rank_count)
+        _RANK_TABLES[n_cards] = table
+    return table
+
+
+def flush_table():
+    '''
+    Returns the table from 13 bit rank mask of one suit to its flush or straight flush strength,
+    0 for masks with less than five cards. The table is built on first use.
+    '''
+    if not _FLUSH_TABLE:
+        _FLUSH_TABLE.extend(_flush_strength(rank_mask) for rank_mask in range(1 << N_RANKS))
+    return _FLUSH_TABLE
+
+
+def evaluate(cards):
+    '''
+    Computes the strength of the best pokerhand out of a set of cards. Hands of up to 7 cards are
+    looked up in the rank and flush tables, larger sets are counted.
+    :param cards: a single PlayingCard or card code, or a list of them
+    :return the strength as an int, higher is better
+    :raises ValueError: if there are no cards or a card is repeated
+    '''
+    codes = card_codes(cards)
+    n_cards = len(codes)
+    if n_cards == 0:
+        raise ValueError('No cards in hand or on table')
+
+    mask = 0
+    for code in codes:
+        mask |= 1 << code
+    if bin(mask).count('1') != n_cards:
+        raise ValueError('The same card is in the hand twice')
+    if n_cards <= 7:
+        return _table_strength(n_cards, sum(_CARD_KEYS[code] for code in codes), mask)
+
+    rank_count = [0] * N_RANKS
+    for code in codes:
+        rank_count[code % N_RANKS] += 1
+    return _add_flushes(_count_strength(rank_count), mask)
+
+
+def _add_flushes(strength, mask):
+    '''Raises a strength ignoring the suits to the best flush in the hand bitmask, if any'''
+    flushes = flush_table()
+    for shift in range(0, N_CARDS, N_RANKS):
+        strength = max(strength, flushes[mask >> shift & 0x1FFF])
+    return strength
+
+
+def _table_strength(n_cards, key, mask):
+    '''Looks up the strength of a hand of at most 7 cards from its rank key sum and bitmask'''
+    strength = rank_table(n_cards)[key]
+    if n_cards >= 5:
+        strength = _add_flushes(strength, mask)
+    return strength
+
+
+def evaluate_mask(mask):
+    '''Computes the strength of the best pokerhand in a hand bitmask, see evaluate'''
+    return evaluate(mask_codes(mask))
+
+
+def _subset_keys(codes, size):
+    '''Returns the distinct rank key sums of the size-card subsets of codes'''
+    return set(map(sum, itertools.combinations([_CARD_KEYS[code] for code in codes], size)))
+
+
+def _suit_ranks(codes):
+    '''Returns the rank indices of the codes grouped by suit'''
+    ranks = [[] for _ in range(N_SUITS)]
+    for code in codes:
+        ranks[code // N_RANKS].append(code % N_RANKS)
+    return ranks
+
+
+def evaluate_exact(hole, board, n_hole=2):
+    '''
+    Computes the strength of the best pokerhand that uses exactly n_hole of the hole cards and
+    5 - n_hole of the board cards, as in Omaha with n_hole 2. Subsets with the same ranks are
+    looked up once, and flushes are only looked for in suits with enough hole and board cards.
+    :param hole: the hole cards, PlayingCard objects or card codes
+    :param board: the board cards
+    :param n_hole: number of hole cards to use
+    :return the strength as an int, higher is better
+    '''
+    hole, board = card_codes(hole), card_codes(board)
+    n_board = 5 - n_hole
+    if not 0 <= n_hole <= 5 or len(hole) < n_hole or len(board) < n_board:
+        raise ValueError('Need %d hole cards and %d board cards' % (n_hole, n_board))
+
+    table = rank_table(5)
+    board_keys = _subset_keys(board, n_board)
+    strength = max(table[hole_key + board_key] for hole_key in _subset_keys(hole, n_hole) for board_key in board_keys)
+
+    board_ranks = _suit_ranks(board)
+    if max(map(len, board_ranks)) < n_board:
+        return strength
+    flushes = flush_table()
+    for hole_suit, board_suit in zip(_suit_ranks(hole), board_ranks):
+        if len(hole_suit) < n_hole or len(board_suit) < n_board:
+            continue
+        board_masks = [hand_mask(subset) for subset in itertools.combinations(board_suit, n_board)]
+        for subset in itertools.combinations(hole_suit, n_hole):
+            hole_mask = hand_mask(subset)
+            strength = max(strength, max(flushes[hole_mask | board_mask] for board_mask in board_masks))
+    return strength
+
+
+class HandState(object):
+    """
+    The HandState class is the incremental evaluator state of a hand: the number of cards, the sum of
+    their rank keys and the hand bitmask. Cards are added and removed in constant time and the state
+    is evaluated with a single table lookup, so a shared prefix such as the hole cards and the flop is
+    never counted again.
+    """
+    def __init__(self, codes=()):
+        self.n_cards = 0
+        self.key = 0
+        self.mask = 0
+        for code in codes:
+            self.add(code)
+
+    def add(self, code):
+        '''Adds a card code to the state'''
+        if self.mask >> code & 1:
+            raise ValueError('The card is already in the hand')
+        self.n_cards += 1
+        self.key += _CARD_KEYS[code]
+        self.mask |= 1 << code
+
+    def remove(self, code):
+        '''Removes a card code from the state'''
+        if not self.mask >> code & 1:
+            raise ValueError('The card is not in the hand')
+        self.n_cards -= 1
+        self.key -= _CARD_KEYS[code]
+        self.mask &= ~(1 << code)
+
+    def fork(self):
+        '''Returns an independent copy of the state'''
+        state = HandState()
+        state.n_cards, state.key, state.mask = self.n_cards, self.key, self.mask
+        return state
+
+    def evaluate(self):
+        '''
+        Computes the strength of the best pokerhand in the state, see evaluate
+        :return the strength as an int, higher is better
+        '''
+        if self.n_cards == 0:
+            raise ValueError('No cards in hand or on table')
+        if self.n_cards > 7:
+            return evaluate(mask_codes(self.mask))
+        return _table_strength(self.n_cards, self.key, self.mask)
+
+    def next_strengths(self, codes):
+        '''
+        Computes the strength of the state with each of the given cards added, one at a time
+        :param codes: iterable of card codes not in the state
+        :return a list of strengths in the order of codes
+        '''
+        n_cards = self.n_cards + 1
+        if n_cards > 7:
+            return [evaluate(mask_codes(self.mask | 1 << code)) for code in codes]
+        return [_table_strength(n_cards, self.key + _CARD_KEYS[code], self.mask | 1 << code) for code in codes]
+
+
 class Deck(object):
     """
-    In the Deck class, 52 cards are created and stored in the "deck" variable.
+    In the Deck class the 52 card codes are stored in a preallocated list. The cards between the
+    bottom and top cursors are left in the deck, the top card last. Cards are dealt by moving the top
+    cursor down and dead cards are moved below the bottom cursor, so nothing is reallocated.
     """
     def __init__(self):
-        deck = np.array([])
-        for j in range(0, 4):
-            for i in range(2, 11):
-                deck = np.append(deck, NumberedCard(i, Suit(j)))
-            deck = np.append(deck, JackCard(Suit(j)))
-            deck = np.append(deck, QueenCard(Suit(j)))
-            deck = np.append(deck, KingCard(Suit(j)))
-            deck = np.append(deck, AceCard(Suit(j)))
-        self.deck = deck
-
-    def shuffle_deck(self):
-        '''Randomly shuffles the Deck objects deck'''
-        np.random.shuffle(self.deck)
+        self._cards = list(range(N_CARDS))
+        self._bottom = 0
+        self._top = N_CARDS
+
+    def __len__(self):
+        return self._top - self._bottom
+
+    @property
+    def codes(self):
+        '''The card codes left in the deck, the top card last'''
+        return self._cards[self._bottom:self._top]
+
+    @property
+    def deck(self):
+        '''The remaining cards as a NumPy array of PlayingCard objects, the top card last'''
+        import numpy as np
+        return np.array([decode_card(code) for code in self.codes], dtype=object)
+
+    def shuffle_deck(self, rng=None):
+        '''
+        Randomly shuffles the cards left in the deck, in place
+        :param rng: a numpy.random.Generator, the global NumPy random state is used if None
+        '''
+        live = self.codes
+        if rng is None:
+            import numpy as np
+            np.random.shuffle(live)
+        else:
+            rng.shuffle(live)
+        self._cards[self._bottom:self._top] = live
 
     def take_top_card(self):
         '''
         takes the top card from the deck
-        :return: the deck itself without the topcard
-                and the topcard itself
+        :return: the topcard itself, the deck is left without the topcard
         '''
-        topcard = self.deck[-1]
-        self.deck = np.delete(self.deck, -1)
+        if self._top == self._bottom:
+            raise IndexError('No cards left in the deck')
+        self._top -= 1
 
-        return topcard
+        return decode_card(self._cards[self._top])
+
+    def deal(self, n):
+        '''
+        Takes several cards from the top of the deck
+        :param n: number of cards to deal
+        :return a list with the n card codes, in the order take_top_card would give them
+        :raises ValueError: if n is negative or more than the cards left
+        '''
+        if not 0 <= n <= len(self):
+            raise ValueError('Can not deal %d cards, %d left in the deck' % (n, len(self)))
+        self._top -= n
+        return self._cards[self._top:self._top + n][::-1]
+
+    def remove_cards(self, cards):
+        '''
+        Removes known cards, e.g. dead cards, from the deck. The order of the other cards is kept.
+        :param cards: a single PlayingCard or card code, or a list of them
+        '''
+        codes = set(card_codes(cards))
+        live = self.codes
+        dead = [code for code in live if code in codes]
+        if len(dead) != len(codes):
+            raise ValueError('Cards not in the deck can not be removed')
+        self._cards[self._bottom:self._top] = dead + [code for code in live if code not in codes]
+        self._bottom += len(dead)
+
+    def reset(self, rng=None, shuffle=False):
+        '''
+        Puts all 52 cards back in the deck, without reallocating
+        :param rng: a numpy.random.Generator used if the deck is shuffled
+        :param shuffle: if True the deck is shuffled after the reset
+        '''
+        self._bottom = 0
+        self._top = N_CARDS
+        if shuffle:
+            self.shuffle_deck(rng)
 
 
 class PlayerHand:
     """
     The playerhand class can be used to create a player hand. The hand may be given cards, have cards removed,
-    sorted and evaluated for the best poker hand.
+    sorted and evaluated for the best poker hand. The cards are held as card codes and as a hand bitmask.
     """
 
-    def __init__(self):
-        self.cards = np.array([])
+    def __init__(self, n_hole=None):
+        '''
+        :param n_hole: if given, the best pokerhand must use exactly n_hole cards of the hand and the
+            rest from the table, e.g. 2 for Omaha. By default the best five of all cards are used.
+        '''
+        self.codes = []
+        self.state = HandState()
+        self.n_hole = n_hole
+
+    @property
+    def mask(self):
+        '''The hand bitmask of the cards in the hand'''
+        return self.state.mask
+
+    @property
+    def cards(self):
+        '''The cards in the hand as a NumPy array of PlayingCard objects'''
+        import numpy as np
+        return np.array([decode_card(code) for code in self.codes], dtype=object)
 
     def give_card(self, card):
         '''
         Adds a card to the hand.
-        :param card: The PlayingCard object to be added
-        :return The cards, with the specified card added
+        :param card: The PlayingCard object or card code to be added
         '''
-        self.cards = np.append(self.cards, card)
-
+        code, = card_codes(card)
+        self.state.add(code)
+        self.codes.append(code)
 
     def remove_card(self, index):
         '''
         Removes the card in the hand at the specified indicies
-        :param index: indices for card to be removed
-        :return The cards, with the specified card removed
+        :param index: an index or a list of indices for the cards to be removed
         '''
-        self.cards = np.delete(self.cards, index)
+        if isinstance(index, numbers.Integral):
+            index = [index]
+        positions = set(range(len(self.codes))[i] for i in index)
+        for position in positions:
+            self.state.remove(self.codes[position])
+        self.codes = [code for position, code in enumerate(self.codes) if position not in positions]
 
     def sort_cards(self):
         '''Sorts the cards in the hand'''
+        import numpy as np
         return np.sort(self.cards)
 
 
-    def best_poker_hand(self, cards):
+    def best_poker_hand(self, cards, cache=None):
         '''
-        Computes the best pokerhand out of a set of cards
-        :param cards: a single PlayingCard or a list of PlayingCard objects
+        Computes the best pokerhand out of a set of cards, using exactly n_hole cards of the hand if it is set
+        :param cards: a single PlayingCard or card code, or a list of them
+        :param cache: an optional LRUCache, only for hands with n_hole set, the strength is then looked up by the
+            canonical form of the cards. Without n_hole the table lookup is cheaper than the canonical form.
         :return a PokerHand object containing the CardCombo and the highest cards
+        :raises ValueError: if a cache is given for a hand without n_hole
+        '''
+        if cache is not None and self.n_hole is None:
+            raise ValueError('The cache is only used for hands with n_hole set')
+        if _instrumentation is not None:
+            _instrumentation.best_poker_hand(self, cards, cache)
+            return
+        self._set_pokerhand(self._lookup(self._count(cards), cache))
+
+    def _count(self, cards):
+        '''Returns a fork of the hand state with the cards added, or the card codes with n_hole set'''
+        if self.n_hole is not None:
+            return card_codes(cards)
+        state = self.state.fork()
+        for code in card_codes(cards):
+            state.add(code)
+        return state
+
+    def _lookup(self, state, cache):
+        '''Evaluates the result of _count, through the cache if there is one'''
+        if self.n_hole is None:
+            return state.evaluate()
+        if cache is None:
+            return evaluate_exact(self.codes, state, self.n_hole)
+        key = ('exact', self.n_hole) + canonical_form(self.codes, state)
+        return cache.lookup(key, lambda: evaluate_exact(self.codes, state, self.n_hole))
+
+    def _set_pokerhand(self, strength):
+        self.strength = strength
+        self.card_combo = strength_combo(strength)
+        self.card_values = strength_values(strength)
+        self.pokerhand = PokerHand.from_strength(strength)
+
+    @staticmethod
+    def check_poker_hand(cards):
         '''
-        cards = np.append(self.cards, cards)
+        Computes the best pokerhand by running the check functions one by one, strongest first.
+        This is the reference for the table driven evaluate function.
+        :param cards: a single PlayingCard or card code, or a list of them
+        :return the CardCombo and a list of the highest cards
+        '''
+        codes = card_codes(cards)
         value_count = [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0]
-        self.card_combo = None
+        card_combo = None
 
         suit_card_connector = [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0]
         suit_count = [0, 0, 0, 0]
-        for card in cards:
-            val = card.value
-            value_count[val-1] += 1
-            suit = card.suit
-            suit_count[suit.value] += 1
+        for code in codes:
+            value_count[code % N_RANKS + 1] += 1
+            suit_count[code // N_RANKS] += 1
         if max(suit_count) >= 5:
-            for card in cards:
-                if card.suit.value == suit_count.index(max(suit_count)):
-                    suit_card_connector[card.value - 1] = 1
+            for code in codes:
+                if code // N_RANKS == suit_count.index(max(suit_count)):
+                    suit_card_connector[code % N_RANKS + 1] = 1
         if sum(value_count) == 0:
             raise ValueError('No cards in hand or on table')
 
-        v, card_values = self.check_straight_flush(suit_card_connector, suit_count)
+        v, card_values = PlayerHand.check_straight_flush(suit_card_connector, suit_count)
         if card_values is not None:
-            self.card_combo = v
-            self.card_values = card_values
-
-        if self.card_combo is None:
-            v, card_values = self.check_four_of_a_kind(value_count)
-            if v is not None:
-                self.card_combo = v
-                self.card_values = card_values
-
-        if self.card_combo is None:
-            v, card_values = self.check_full_house(value_count)
-            if v is not None:
-                self.card_combo = v
-                self.card_values = card_values
-
-        if self.card_combo is None:
-            v, card_values = self.check_flush(suit_count, suit_card_connector)
-            if v is not None:
-                self.card_combo = v
-                self.card_values = card_values
-
-        if self.card_combo is None:
-            v, card_values = self.check_straight(value_count)
-            if v is not None:
-                self.card_combo = v
-                self.card_values = card_values
-
-        if self.card_combo is None:
-            v, card_values = self.check_three_of_a_kind(value_count)
-            if v is not None:
-                self.card_combo = v
-                self.card_values = card_values
-
-        if self.card_combo is None:
-            v , card_values = self.check_two_pair(value_count)
-            if v is not None:
-                self.card_combo = v
-                self.card_values = card_values
-
-        if self.card_combo is None:
-            v, card_values = self.check_one_pair(value_count)
-            if v is not None:
-                self.card_combo = v
-                self.card_values = card_values
-
-        if self.card_combo is None:
-            self.card_combo, self.card_values = self.high_card(value_count)
-
-        self.pokerhand = PokerHand(self.card_combo, self.card_values)
+            card_combo = v
+
+        if card_combo is None:
+            card_combo, card_values = PlayerHand.check_four_of_a_kind(value_count)
+
+        if card_combo is None:
+            card_combo, card_values = PlayerHand.check_full_house(value_count)
+
+        if card_combo is None:
+            card_combo, card_values = PlayerHand.check_flush(suit_count, suit_card_connector)
+
+        if card_combo is None:
+            card_combo, card_values = PlayerHand.check_straight(value_count)
+
+        if card_combo is None:
+            card_combo, card_values = PlayerHand.check_three_of_a_kind(value_count)
+
+        if card_combo is None:
+            card_combo, card_values = PlayerHand.check_two_pair(value_count)
+
+        if card_combo is None:
+            card_combo, card_values = PlayerHand.check_one_pair(value_count)
+
+        if card_combo is None:
+            card_combo, card_values = PlayerHand.high_card(value_count)
+
+        return CardCombo(card_combo), card_values
 
     @staticmethod
     def high_card(value_count):
@@ -333,10 +861,10 @@ class PlayerHand:
                 elif data == 1:
                     single_cards.append(j+1)
             card_values = pairs[:2]
-            if pairs[-1] == card_values[-1]:
-                card_values.append(single_cards[0])
-            else:
-                card_values.append(max(single_cards[0], pairs[2]))
+            # The kicker is the highest other card, a card of a third pair counts
+            kickers = single_cards[:1] + pairs[2:3]
+            if kickers:
+                card_values.append(max(kickers))
 
             return 2, card_values
         else:
@@ -355,7 +883,7 @@ class PlayerHand:
             for j, data in reversed(list(enumerate(value_count))):
                 if data == 1:
                     single_cards.append(j + 1)
-            card_values = [value_count.index(3) + 1,  single_cards[0], single_cards[1]]
+            card_values = [value_count.index(3) + 1] + single_cards[:2]
             return 3, card_values
         else:
             return None, None
@@ -367,6 +895,7 @@ class PlayerHand:
         :return  None if no two pair is found, else 4 ( the value of a two pair) and
         the highest card in the straight'''
         n = 13
+        value_count = list(value_count)
         if value_count[13] != 0:
             value_count[0] = 1
         for i in reversed(value_count):
@@ -406,19 +935,13 @@ class PlayerHand:
                  :return  None if no full house is found, else 6 ( the value of a full house) and
                  a list with the three of a kind and the pair'''
         if 3 in value_count:
-            card_values = []
+            three = len(value_count) - 1 - value_count[::-1].index(3)
+            card_values = [three + 1]
             for j, data in reversed(list(enumerate(value_count))):
-                if data == 3:
-                    card_values.append(j+1)
-            if len(card_values) == 2:
-                return 6, card_values
-            elif 2 in value_count:
-                for j, data in reversed(list(enumerate(value_count))):
-                    if data == 2:
-                        card_values.append(j + 1)
-                        return 6, card_values
-            else:
-                return None, None
+                if data >= 2 and j != three:
+                    card_values.append(j + 1)
+                    return 6, card_values
+            return None, None
         else:
             return None, None
 
@@ -430,10 +953,12 @@ class PlayerHand:
                  a list with the four of a kind and the highest card exluding the four of a kind
                  '''
         if 4 in value_count:
+            card_values = [value_count.index(4)+1]
             for j, data in reversed(list(enumerate(value_count))):
                 if data in range(1, 4):
-                    card_values = [value_count.index(4)+1, j+1]
-                    return 7, card_values
+                    card_values.append(j+1)
+                    break
+            return 7, card_values
         else:
             return None, None
 
@@ -449,6 +974,7 @@ class PlayerHand:
                  the highest card in the straight flush
         '''
         if max(suit_count) >= 5:
+            suit_card_connector = list(suit_card_connector)
             if suit_card_connector[13]:
                 suit_card_connector[0] = True
             for i, data in reversed(list(enumerate(suit_card_connector))):
@@ -465,14 +991,237 @@ class PlayerHand:
             return None, None
 
 
+@functools.total_ordering
 class PokerHand:
-    '''Class to represent the pokerhands and making them comparable'''
+    '''Class to represent the pokerhands and making them comparable. Each pokerhand carries its
+    strength as a single integer key, which is compared, tested for equality and hashed.'''
     def __lt__(self, other):
-        return (self.cardcombo, self.highcard) < (other.cardcombo, other.highcard)
+        return self.key < other.key
+
+    def __eq__(self, other):
+        return isinstance(other, PokerHand) and self.key == other.key
+
+    def __hash__(self):
+        return hash(self.key)
 
     def __init__(self, cardcombo, highcard):
         self.highcard = highcard
         self.cardcombo = CardCombo(cardcombo)
+        self.key = pack_strength(self.cardcombo, highcard)
+
+    @classmethod
+    def from_strength(cls, strength):
+        '''Creates the PokerHand of a strength computed by evaluate'''
+        pokerhand = cls.__new__(cls)
+        pokerhand.highcard = strength_values(strength)
+        pokerhand.cardcombo = strength_combo(strength)
+        pokerhand.key = strength
+        return pokerhand
+
+
+Showdown = collections.namedtuple('Showdown', ['strengths', 'winners', 'order', 'ranks'])
+Showdown.__doc__ = '''The result of a showdown: the strength of every player, the indices of the winners, all indices
+ordered from best to worst and the rank of every player, the number of players with a better hand'''
+
+
+def showdown(hands, board=(), n_hole=None):
+    '''
+    Resolves a showdown between several players sharing a board
+    :param hands: list of the hole cards of every player, lists of PlayingCard objects or card codes
+    :param board: the cards on the table
+    :param n_hole: if given, every player must use exactly n_hole hole cards, see evaluate_exact
+    :return a Showdown, more than one winner is a tie
+    '''
+    board = card_codes(board)
+    if n_hole is None:
+        strengths = [evaluate(card_codes(hand) + board) for hand in hands]
+    else:
+        strengths = [evaluate_exact(hand, board, n_hole) for hand in hands]
+    order = sorted(range(len(strengths)), key=lambda i: -strengths[i])
+    ranks = [sum(other > strength for other in strengths) for strength in strengths]
+    winners = [i for i in range(len(strengths)) if ranks[i] == 0]
+    return Showdown(strengths, winners, order, ranks)
+
+
+def canonical_form(*groups):
+    '''
+    Relabels the suits of groups of cards, e.g. the hole cards and the board, into a canonical form.
+    The suits are ordered by the ranks they hold in the first group, then in the second and so on,
+    so all spots that are equal up to a permutation of the suits get the same form.
+    :param groups: any number of PlayingCard objects or card codes, or lists of them
+    :return a tuple with the canonical hand bitmask of each group
+    '''
+    masks = [hand_mask(card_codes(group)) for group in groups]
+    signatures = [tuple(mask >> shift & 0x1FFF for mask in masks) for shift in range(0, N_CARDS, N_RANKS)]
+    signatures.sort(reverse=True)
+    canonical = [0] * len(masks)
+    for shift, signature in zip(range(0, N_CARDS, N_RANKS), signatures):
+        for i, rank_mask in enumerate(signature):
+            canonical[i] |= rank_mask << shift
+    return tuple(canonical)
+
+
+class LRUCache(object):
+    """
+    The LRUCache class is a memoization layer holding at most maxsize results. The least recently
+    used result is evicted first, and hits, misses and evictions are counted.
+    """
+    def __init__(self, maxsize=1 << 16):
+        self.maxsize = maxsize
+        self.results = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
 
+    def __len__(self):
+        return len(self.results)
 
+    def lookup(self, key, compute):
+        '''
+        Returns the cached result for key, computing and storing it on a miss
+        :param key: hashable key, e.g. a canonical_form
+        :param compute: function without arguments computing the result
+        '''
+        try:
+            result = self.results[key]
+        except KeyError:
+            self.misses += 1
+            result = self.results[key] = compute()
+            if len(self.results) > self.maxsize:
+                self.results.popitem(last=False)
+                self.evictions += 1
+            return result
+        self.hits += 1
+        self.results.move_to_end(key)
+        return result
+
+    def stats(self):
+        '''Returns a dict with the hits, misses, evictions, size and maxsize of the cache'''
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'size': len(self.results), 'maxsize': self.maxsize}
+
+    def clear(self):
+        '''Empties the cache and resets the counters'''
+        self.results.clear()
+        self.hits = self.misses = self.evictions = 0
+
+
+class Instrumentation(object):
+    """
+    The Instrumentation class collects counters and timing histograms of best_poker_hand and of
+    the batch evaluator while it is enabled with enable_instrumentation. When it is disabled the
+    evaluator only tests a single module variable.
+
+    best_poker_hand is timed in three phases: 'count', adding the cards to a fork of the hand
+    state, 'lookup', the table or cache lookup, and 'pokerhand', building the PokerHand. Histogram
+    bucket i counts the calls that took less than 2**i nanoseconds but not less than 2**(i-1).
+    """
+    PHASES = ('count', 'lookup', 'pokerhand', 'batch')
+    BUCKETS = 40
 
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.hands = 0
+        self.combos = [0] * len(CardCombo)
+        self.calls = dict((phase, 0) for phase in self.PHASES)
+        self.nanoseconds = dict((phase, 0) for phase in self.PHASES)
+        self.histograms = dict((phase, [0] * self.BUCKETS) for phase in self.PHASES)
+
+    def record(self, phase, nanoseconds):
+        '''Records the duration of one call of a phase'''
+        self.calls[phase] += 1
+        self.nanoseconds[phase] += nanoseconds
+        self.histograms[phase][min(nanoseconds.bit_length(), self.BUCKETS - 1)] += 1
+
+    def best_poker_hand(self, hand, cards, cache):
+        '''Runs PlayerHand.best_poker_hand, timing its phases'''
+        start = time.perf_counter_ns()
+        state = hand._count(cards)
+        counted = time.perf_counter_ns()
+        strength = hand._lookup(state, cache)
+        looked_up = time.perf_counter_ns()
+        hand._set_pokerhand(strength)
+        end = time.perf_counter_ns()
+
+        self.record('count', counted - start)
+        self.record('lookup', looked_up - counted)
+        self.record('pokerhand', end - looked_up)
+        self.hands += 1
+        self.combos[strength >> STRENGTH_SHIFT] += 1
+
+    def snapshot(self):
+        '''
+        Exports the collected data
+        :return a dict with the elapsed seconds, the number of hands and hands per second, the count
+            of every CardCombo outcome and per phase the calls, total seconds and non-empty histogram
+            buckets keyed by their upper bound in nanoseconds
+        '''
+        elapsed = time.perf_counter() - self.started
+        return {
+            'elapsed': elapsed,
+            'hands': self.hands,
+            'hands_per_sec': self.hands / elapsed if elapsed else 0.0,
+            'combos': dict((combo.name, self.combos[combo]) for combo in CardCombo),
+            'phases': dict((phase, {
+                'calls': self.calls[phase],
+                'seconds': self.nanoseconds[phase] * 1e-9,
+                'histogram': dict((1 << bucket, count) for bucket, count in enumerate(self.histograms[phase]) if count),
+            }) for phase in self.PHASES),
+        }
+
+
+_instrumentation = None
+
+
+def enable_instrumentation():
+    '''
+    Starts collecting counters and timings in a fresh Instrumentation
+    :return the Instrumentation
+    '''
+    global _instrumentation
+    _instrumentation = Instrumentation()
+    return _instrumentation
+
+
+def disable_instrumentation():
+    '''
+    Stops collecting counters and timings
+    :return the snapshot of the Instrumentation that was enabled, None if there was none
+    '''
+    global _instrumentation
+    instrumentation, _instrumentation = _instrumentation, None
+    return instrumentation.snapshot() if instrumentation is not None else None
+
+
+def active_instrumentation():
+    '''Returns the enabled Instrumentation, None if it is disabled'''
+    return _instrumentation
+
+
+def instrumentation_snapshot():
+    '''Returns the snapshot of the enabled Instrumentation, None if it is disabled'''
+    return _instrumentation.snapshot() if _instrumentation is not None else None
+
+
+# The NumPy backed batch features are imported from their modules on first use, so importing the
+# core of the card library does not load NumPy.
+_LAZY_ATTRIBUTES = {
+    'evaluate_batch': 'batch',
+    'showdown_batch': 'batch',
+    'shuffled_decks': 'batch',
+    'deal_cards': 'batch',
+    'deal_hands': 'batch',
+    'monte_carlo_equity': 'equity',
+    'exact_equity': 'equity',
+    'adaptive_equity': 'equity',
+    'parse_range': 'ranges',
+    'range_equity': 'ranges',
+    'board_table': 'boardtable',
+    'next_cards': 'outs',
+}
+
+
+def __getattr__(name):
+    if name in _LAZY_ATTRIBUTES:
+        return getattr(importlib.import_module(_LAZY_ATTRIBUTES[name]), name)
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
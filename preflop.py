@@ -0,0 +1,244 @@
+"""
+Preflop all-in equity tables for the 169 starting hand classes and the 1326 hole card combos,
+computed once with the batch evaluator and memory-mapped from a binary file.
+"""
+import argparse
+import os
+import struct
+import numpy as np
+import poker
+import batch
+import shared
+
+
+N_CLASSES = 169
+N_COMBOS = 1326
+RANK_NAMES = poker.RANK_CHARS
+
+# Equities are stored as uint16, scaled so that EQUITY_SCALE is an equity of 1. NO_MATCHUP marks
+# combo pairs sharing a card.
+EQUITY_SCALE = 65534
+NO_MATCHUP = 65535
+
+MAGIC = b'PKEQ'
+VERSION = 1
+_HEADER = struct.Struct('<4sHHII')
+
+
+def combo_index(hole):
+    '''
+    Returns the index, 0-1325, of a pair of hole cards
+    :param hole: the two hole cards, PlayingCard objects or card codes
+    '''
+    low, high = sorted(poker.card_codes(hole))
+    return high * (high - 1) // 2 + low
+
+
+def combo_cards(index):
+    '''Returns the two card codes, lowest first, of a combo index'''
+    high = int((1 + (1 + 8 * index) ** 0.5) / 2)
+    while high * (high - 1) // 2 > index:
+        high -= 1
+    return [index - high * (high - 1) // 2, high]
+
+
+def hand_class(hole):
+    '''
+    Returns the starting hand class, 0-168, of a pair of hole cards. Classes are laid out on a
+    13 x 13 grid: pairs on the diagonal, suited hands with the higher rank as row and offsuit hands
+    with the higher rank as column.
+    :param hole: the two hole cards, PlayingCard objects or card codes
+    '''
+    first, second = poker.card_codes(hole)
+    high, low = max(first % 13, second % 13), min(first % 13, second % 13)
+    if first // 13 == second // 13:
+        return high * 13 + low
+    return low * 13 + high
+
+
+def class_name(index):
+    '''Returns the name of a starting hand class, e.g. 'AA', 'AKs' or '72o' '''
+    row, column = divmod(index, 13)
+    if row == column:
+        return RANK_NAMES[row] * 2
+    if row > column:
+        return RANK_NAMES[row] + RANK_NAMES[column] + 's'
+    return RANK_NAMES[column] + RANK_NAMES[row] + 'o'
+
+
+def class_index(name):
+    '''Returns the starting hand class of a name such as 'AA', 'AKs' or 'AKo' '''
+    high, low = RANK_NAMES.index(name[0]), RANK_NAMES.index(name[1])
+    if high < low:
+        high, low = low, high
+    if high == low:
+        return high * 13 + low
+    return high * 13 + low if name[2:] == 's' else low * 13 + high
+
+
+def _class_combos():
+    '''Returns a (169, 12, 2) array of the combos of each class, padded, and the number of combos'''
+    combos = [[] for _ in range(N_CLASSES)]
+    for first, second in batch.combinations(poker.N_CARDS, 2):
+        combos[hand_class([first, second])].append((first, second))
+    counts = np.array([len(class_combos) for class_combos in combos])
+    padded = np.zeros((N_CLASSES, 12, 2), dtype=np.int8)
+    for index, class_combos in enumerate(combos):
+        padded[index, :len(class_combos)] = class_combos
+    return padded, counts
+
+
+def _matchup_equities(heroes, villains, rng):
+    '''
+    Deals one random board per row and returns the equity of the hero in it, 1 for a win and
+    0.5 for a tie
+    :param heroes: (N, 2) array of hero hole cards
+    :param villains: (N, 2) array of villain hole cards, sharing no card with the hero
+    '''
+    boards = batch.deal_excluding(np.hstack([heroes, villains]), 5, rng)
+    hero_strengths = batch.evaluate_batch(np.hstack([heroes, boards]))
+    villain_strengths = batch.evaluate_batch(np.hstack([villains, boards]))
+    return (hero_strengths > villain_strengths) + 0.5 * (hero_strengths == villain_strengths)
+
+
+def _class_row(job):
+    '''Computes the equities of one class against all classes, the work of a single process'''
+    hero_class, trials, seed = job
+    rng = np.random.default_rng(seed)
+    combos, counts = _class_combos()
+    villain_classes = np.repeat(np.arange(N_CLASSES), trials)
+
+    def sample(classes):
+        return combos[classes, (rng.random(len(classes)) * counts[classes]).astype(np.intp)]
+
+    heroes = sample(np.full(len(villain_classes), hero_class))
+    villains = sample(villain_classes)
+    conflicts = np.flatnonzero((heroes[:, :, None] == villains[:, None, :]).any(axis=(1, 2)))
+    while len(conflicts):
+        villains[conflicts] = sample(villain_classes[conflicts])
+        overlap = (heroes[conflicts, :, None] == villains[conflicts, None, :]).any(axis=(1, 2))
+        conflicts = conflicts[overlap]
+    equities = _matchup_equities(heroes.astype(np.intp), villains.astype(np.intp), rng)
+    return np.bincount(villain_classes, weights=equities, minlength=N_CLASSES) / trials
+
+
+def _combo_row(job):
+    '''Computes the equities of one combo against all combos, the work of a single process'''
+    hero_combo, trials, seed = job
+    rng = np.random.default_rng(seed)
+    hero = combo_cards(hero_combo)
+    villain_cards = np.array([combo_cards(index) for index in range(N_COMBOS)])
+    valid = ~np.isin(villain_cards, hero).any(axis=1)
+    villains = np.repeat(villain_cards[valid], trials, axis=0)
+    heroes = np.tile(np.array(hero), (len(villains), 1))
+    equities = _matchup_equities(heroes, villains, rng).reshape(-1, trials).mean(axis=1)
+
+    row = np.full(N_COMBOS, NO_MATCHUP, dtype=np.uint16)
+    row[np.flatnonzero(valid)] = np.round(equities * EQUITY_SCALE)
+    return row
+
+
+def _run(function, jobs, processes, tables):
+    if processes is None:
+        processes = os.cpu_count() or 1
+    if processes <= 1:
+        return [function(job) for job in jobs]
+    with shared.pool(processes, tables, n_cards=(7,)) as pool:
+        return pool.map(function, jobs)
+
+
+def compute_tables(trials=10000, combo_trials=0, processes=None, seed=None, tables=None):
+    '''
+    Computes the preflop equity tables by dealing random boards in a pool of processes
+    :param trials: number of boards dealt for every pair of classes
+    :param combo_trials: number of boards dealt for every pair of combos, no combo table if 0
+    :param processes: number of worker processes, all cores if None, no pool if 1
+    :param seed: seed for numpy.random.SeedSequence, fresh entropy if None
+    :param tables: the shared.SharedTables of the workers, created for each pool if None
+    :return (169, 169) uint16 class table and (1326, 1326) uint16 combo table or None
+    '''
+    class_seeds, combo_seeds = np.random.SeedSequence(seed).spawn(2)
+    rows = _run(_class_row, [(index, trials, row_seed)
+                             for index, row_seed in enumerate(class_seeds.spawn(N_CLASSES))], processes, tables)
+    classes = np.array(rows)
+    classes = np.round((classes + 1 - classes.T) / 2 * EQUITY_SCALE).astype(np.uint16)
+
+    combos = None
+    if combo_trials:
+        combos = np.array(_run(_combo_row, [(index, combo_trials, row_seed)
+                                            for index, row_seed in enumerate(combo_seeds.spawn(N_COMBOS))], processes, tables))
+    return classes, combos
+
+
+def write_tables(path, classes, combos=None):
+    '''
+    Writes the preflop tables to a binary file: a header followed by the class table and, if
+    present, the combo table, both as little endian uint16
+    '''
+    with open(path, 'wb') as file:
+        file.write(_HEADER.pack(MAGIC, VERSION, N_CLASSES, N_COMBOS if combos is not None else 0, 0))
+        file.write(np.ascontiguousarray(classes, dtype='<u2').tobytes())
+        if combos is not None:
+            file.write(np.ascontiguousarray(combos, dtype='<u2').tobytes())
+
+
+class PreflopTable(object):
+    """
+    The PreflopTable class memory-maps a file written by write_tables. The pages are shared by all
+    processes mapping the same file, and every lookup is a single array access.
+    """
+    def __init__(self, path):
+        with open(path, 'rb') as file:
+            magic, version, n_classes, n_combos, _ = _HEADER.unpack(file.read(_HEADER.size))
+        if magic != MAGIC or version != VERSION or n_classes != N_CLASSES:
+            raise ValueError('%s is not a preflop equity table' % path)
+        self.classes = np.memmap(path, dtype='<u2', mode='r', offset=_HEADER.size, shape=(N_CLASSES, N_CLASSES))
+        self.combos = None
+        if n_combos:
+            self.combos = np.memmap(path, dtype='<u2', mode='r', offset=_HEADER.size + 2 * N_CLASSES ** 2,
+                                    shape=(N_COMBOS, N_COMBOS))
+
+    def class_equity(self, hero, villain):
+        '''
+        Looks up the equity of a starting hand class against another
+        :param hero: class index or name of the hero, e.g. 'AKs'
+        :param villain: class index or name of the villain
+        :return the all-in equity of the hero, ties counted as half
+        '''
+        if isinstance(hero, str):
+            hero = class_index(hero)
+        if isinstance(villain, str):
+            villain = class_index(villain)
+        return self.classes[hero, villain] / float(EQUITY_SCALE)
+
+    def equity(self, hero, villain):
+        '''
+        Looks up the equity of the hero's hole cards against the villain's, from the combo table if
+        there is one and else from the class table
+        :return the all-in equity of the hero, None if the hands share a card
+        '''
+        hero, villain = poker.card_codes(hero), poker.card_codes(villain)
+        if set(hero) & set(villain):
+            return None
+        if self.combos is None:
+            return self.class_equity(hand_class(hero), hand_class(villain))
+        value = self.combos[combo_index(hero), combo_index(villain)]
+        if value == NO_MATCHUP:
+            return None
+        return value / float(EQUITY_SCALE)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Computes the preflop equity tables and writes them to a file.')
+    parser.add_argument('path', help='output file')
+    parser.add_argument('--trials', type=int, default=10000, help='boards per pair of classes')
+    parser.add_argument('--combo-trials', type=int, default=0, help='boards per pair of combos, 0 for no combo table')
+    parser.add_argument('--processes', type=int, default=None, help='worker processes, all cores by default')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args(argv)
+    classes, combos = compute_tables(args.trials, args.combo_trials, args.processes, args.seed)
+    write_tables(args.path, classes, combos)
+
+
+if __name__ == '__main__':
+    main()
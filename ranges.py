@@ -0,0 +1,257 @@
+"""
+Hand ranges in the usual notation, e.g. 'QQ+, AKs, 76s-54s', expanded to weighted hole card
+combos, and the equity of one range against another computed with the batch evaluator.
+"""
+import collections
+import functools
+import re
+import numpy as np
+import poker
+import batch
+import boardtable
+
+
+RangeEquity = collections.namedtuple('RangeEquity', ['equity', 'combos', 'combo_equities', 'runouts'])
+RangeEquity.__doc__ = '''The equity of the hero range, the hero combos with the equity of each, and the number of runouts'''
+
+# Villain strengths of many groups are sorted together, keyed by group above the strength bits
+_GROUP_SHIFT = 24
+# Upper bound of the number of (runout, combo) cells handled at once
+CHUNK_CELLS = 1 << 20
+
+_RANK = '([%s])' % poker.RANK_CHARS
+_CARD = '([%s][%s])' % (poker.RANK_CHARS, poker.SUIT_CHARS)
+_COMBO_TOKEN = re.compile(_CARD + _CARD + '$')
+_CLASS_TOKEN = re.compile(_RANK + _RANK + '([so]?)(\\+?)$')
+_SPAN_TOKEN = re.compile(_RANK + _RANK + '([so]?)-' + _RANK + _RANK + '([so]?)$')
+
+
+class Range(object):
+    """
+    The Range class holds weighted hole card combos, as an (M, 2) int8 array of card codes with
+    the lowest card first and an (M,) array of weights.
+    """
+    def __init__(self, combos, weights=None):
+        self.combos = np.sort(np.asarray(combos, dtype=np.int8).reshape(-1, 2), axis=1)
+        if weights is None:
+            weights = np.ones(len(self.combos))
+        self.weights = np.asarray(weights, dtype=np.float64)
+
+    def __len__(self):
+        return len(self.combos)
+
+    @property
+    def masks(self):
+        '''The (M,) uint64 hand bitmasks of the combos'''
+        return batch.hand_masks(self.combos)
+
+    def remove_blocked(self, dead):
+        '''
+        Returns the range without the combos holding one of the dead cards
+        :param dead: the known cards, PlayingCard objects or card codes
+        '''
+        live = (self.masks & np.uint64(poker.hand_mask(poker.card_codes(dead)))) == 0
+        return Range(self.combos[live], self.weights[live])
+
+
+def _class_combos(high, low, kind):
+    '''Returns the combos of a starting hand class given by its rank indices and 's', 'o' or '' '''
+    combos = []
+    for first in range(poker.N_SUITS):
+        for second in range(poker.N_SUITS):
+            if high == low and first >= second:
+                continue
+            if kind == 's' and first != second or kind == 'o' and first == second:
+                continue
+            combos.append((high + poker.N_RANKS * first, low + poker.N_RANKS * second))
+    return combos
+
+
+def _token_classes(spec):
+    '''Expands the notation of a token without weight to a list of (high, low, kind) classes'''
+    match = _CLASS_TOKEN.match(spec)
+    if match:
+        high, low = sorted(poker.RANK_CHARS.index(char) for char in match.group(1, 2))[::-1]
+        kind, plus = match.group(3, 4)
+        if high == low:
+            if kind:
+                raise ValueError('A pair can not be %r' % kind)
+            return [(rank, rank, '') for rank in range(high, poker.N_RANKS if plus else high + 1)]
+        return [(high, kicker, kind) for kicker in range(low, high if plus else low + 1)]
+
+    match = _SPAN_TOKEN.match(spec)
+    if match is None or match.group(3) != match.group(6):
+        raise ValueError('Invalid range token %r' % spec)
+    first_high, first_low, second_high, second_low = (poker.RANK_CHARS.index(char) for char in match.group(1, 2, 4, 5))
+    kind = match.group(3)
+    if first_high == first_low and second_high == second_low and not kind:
+        return [(rank, rank, '') for rank in range(min(first_high, second_high), max(first_high, second_high) + 1)]
+    if first_high == second_high and first_low < first_high and second_low < second_high:
+        return [(first_high, kicker, kind)
+                for kicker in range(min(first_low, second_low), max(first_low, second_low) + 1)]
+    if first_high - first_low == second_high - second_low > 0:
+        gap = first_high - first_low
+        return [(high, high - gap, kind) for high in range(min(first_high, second_high), max(first_high, second_high) + 1)]
+    raise ValueError('Invalid range token %r' % spec)
+
+
+def parse_range(text, dead=()):
+    '''
+    Parses a range in the usual notation: comma separated tokens such as 'QQ+', '22-55', 'AKs',
+    'AKo', 'AK', 'ATs+', '76s-54s', 'A5s-A2s' or single combos like 'AsKd', each with an optional
+    ':weight' suffix. A combo listed twice gets the weight of its last token.
+    :param text: the range notation
+    :param dead: known cards, the combos holding one of them are removed
+    :return a Range
+    :raises ValueError: if a token is not valid
+    '''
+    weights = collections.OrderedDict()
+    for token in text.split(','):
+        token = token.strip()
+        if not token:
+            continue
+        spec, _, weight = token.partition(':')
+        weight = float(weight) if weight else 1.0
+        match = _COMBO_TOKEN.match(spec)
+        if match:
+            first, second = (poker.parse_card(name) for name in match.group(1, 2))
+            if first == second:
+                raise ValueError('Invalid range token %r' % spec)
+            combos = [(first, second)]
+        else:
+            combos = [combo for classes in _token_classes(spec) for combo in _class_combos(*classes)]
+        for combo in combos:
+            weights[tuple(sorted(combo))] = weight
+
+    combos = [combo for combo, weight in weights.items() if weight > 0]
+    return Range(combos, [weights[combo] for combo in combos]).remove_blocked(dead)
+
+
+def _combo_strengths(combos, boards, live):
+    '''
+    Evaluates every combo on every board
+    :param combos: (M, 2) array of hole cards
+    :param boards: (R, 5) array of boards
+    :param live: (R, M) boolean array, False where the combo shares a card with the board
+    :return (R, M) int64 array of strengths, 0 where not live
+    '''
+    hands = np.concatenate([np.broadcast_to(combos[None], (len(boards),) + combos.shape),
+                            np.broadcast_to(boards[:, None], (len(boards), len(combos), boards.shape[1]))], axis=2)
+    strengths = np.zeros(live.shape, dtype=np.int64)
+    strengths[live] = batch.evaluate_batch(hands[live])
+    return strengths
+
+
+def _table_strengths(table, combos, boards, live):
+    '''Looks the combos up in the BoardTable of a complete board, see _combo_strengths'''
+    return np.where(live, table.lookup(combos)[None], 0)
+
+
+def _group_scores(n_groups, villain_groups, villain_strengths, villain_weights, hero_groups, hero_strengths):
+    '''
+    Places hero strengths among the villain strengths of the same group. The villain entries of
+    all groups are sorted once, keyed by group above the strength bits, and every hero strength
+    is placed with a binary search.
+    :return the villain weight of its group beaten by every hero entry, ties counted as half,
+        and the total villain weight of its group
+    '''
+    villain_keys = (villain_groups.astype(np.int64) << _GROUP_SHIFT) + villain_strengths
+    order = np.argsort(villain_keys)
+    sorted_keys = villain_keys[order]
+    cumulative = np.concatenate([[0.0], np.cumsum(villain_weights[order])])
+    bounds = cumulative[np.searchsorted(sorted_keys, np.arange(n_groups + 1, dtype=np.int64) << _GROUP_SHIFT)]
+    hero_keys = (hero_groups.astype(np.int64) << _GROUP_SHIFT) + hero_strengths
+    below = cumulative[np.searchsorted(sorted_keys, hero_keys, side='left')]
+    up_to = cumulative[np.searchsorted(sorted_keys, hero_keys, side='right')]
+    return (below + up_to) / 2 - bounds[hero_groups], np.diff(bounds)[hero_groups]
+
+
+def _chunk_scores(hero, villain, same, boards, combo_strengths=_combo_strengths):
+    '''
+    Sums the villain weight beaten by every hero combo over a chunk of runouts, ties counted as
+    half, and the villain weight faced. The villain combos holding a card of the hero combo are
+    taken out by card removal: the combos holding its first card and its second card are
+    subtracted and the identical combo, subtracted twice, is added back.
+    :param same: (Mh,) index of the villain combo identical to every hero combo, -1 if none
+    :param combo_strengths: the function evaluating the combos on the boards, see _combo_strengths
+    :return the (Mh,) scores and (Mh,) weights faced
+    '''
+    n_runouts = len(boards)
+    board_masks = batch.hand_masks(boards)
+    hero_live = (board_masks[:, None] & hero.masks[None]) == 0
+    villain_live = (board_masks[:, None] & villain.masks[None]) == 0
+    hero_strengths = combo_strengths(hero.combos, boards, hero_live)
+    villain_strengths = combo_strengths(villain.combos, boards, villain_live)
+    villain_weights = np.where(villain_live, villain.weights[None], 0.0)
+
+    runouts = np.arange(n_runouts)[:, None]
+    scores, faced = _group_scores(n_runouts, np.broadcast_to(runouts, villain_strengths.shape).ravel(),
+                                  villain_strengths.ravel(), villain_weights.ravel(),
+                                  np.broadcast_to(runouts, hero_strengths.shape).ravel(), hero_strengths.ravel())
+    card_scores, card_faced = _group_scores(
+        n_runouts * poker.N_CARDS, (runouts[:, :, None] * poker.N_CARDS + villain.combos[None]).ravel(),
+        np.repeat(villain_strengths.ravel(), 2), np.repeat(villain_weights.ravel(), 2),
+        (runouts[:, :, None] * poker.N_CARDS + hero.combos[None]).ravel(), np.repeat(hero_strengths.ravel(), 2))
+    scores -= card_scores.reshape(-1, 2).sum(axis=1)
+    faced -= card_faced.reshape(-1, 2).sum(axis=1)
+    scores, faced = scores.reshape(n_runouts, -1), faced.reshape(n_runouts, -1)
+
+    heroes = np.flatnonzero(same >= 0)
+    scores[:, heroes] += villain_weights[:, same[heroes]] / 2
+    faced[:, heroes] += villain_weights[:, same[heroes]]
+    return np.where(hero_live, scores, 0.0).sum(axis=0), np.where(hero_live, faced, 0.0).sum(axis=0)
+
+
+def range_equity(hero, villain, board=(), trials=1 << 14, seed=None):
+    '''
+    Computes the equity of a hero range against a villain range. All runouts of the board are
+    enumerated when there are at most trials of them, else trials random runouts are dealt. Every
+    combo is evaluated once per runout, on a complete board it is looked up in the cached
+    boardtable.BoardTable, and combo pairs sharing a card are left out.
+    :param hero: the hero Range or its notation
+    :param villain: the villain Range or its notation
+    :param board: the 0-5 cards already on the table, combos holding them are removed
+    :param trials: maximum number of runouts to enumerate, the number of random runouts otherwise
+    :param seed: seed of the Generator dealing random runouts
+    :return a RangeEquity with the equity of the hero range, ties counted as half, and of every hero combo
+    :raises ValueError: if no pair of combos is possible
+    '''
+    board = poker.card_codes(board)
+    if len(board) > 5 or len(set(board)) != len(board):
+        raise ValueError('The board must be up to 5 different cards')
+    if isinstance(hero, str):
+        hero = parse_range(hero)
+    if isinstance(villain, str):
+        villain = parse_range(villain)
+    hero, villain = hero.remove_blocked(board), villain.remove_blocked(board)
+
+    remaining = batch.live_cards(board)
+    n_runouts = 1
+    for i in range(5 - len(board)):
+        n_runouts = n_runouts * (len(remaining) - i) // (i + 1)
+    if n_runouts <= trials:
+        runouts = remaining[batch.combinations(len(remaining), 5 - len(board))]
+    else:
+        n_runouts = trials
+        runouts = batch.deal_cards(trials, 5 - len(board), np.random.default_rng(seed), board)
+    boards = np.hstack([np.tile(np.array(board, dtype=np.int8), (n_runouts, 1)), runouts])
+
+    combo_strengths = _combo_strengths
+    if len(board) == 5:
+        combo_strengths = functools.partial(_table_strengths, boardtable.board_table(board))
+
+    identical = hero.masks[:, None] == villain.masks[None]
+    same = np.where(identical.any(axis=1), identical.argmax(axis=1), -1)
+    step = max(1, CHUNK_CELLS // max(len(hero), 2 * len(villain), 1))
+    scores, faced = np.zeros(len(hero)), np.zeros(len(hero))
+    for start in range(0, n_runouts, step):
+        chunk_scores, chunk_faced = _chunk_scores(hero, villain, same, boards[start:start + step], combo_strengths)
+        scores += chunk_scores
+        faced += chunk_faced
+
+    total = np.dot(hero.weights, faced)
+    if not total > 0:
+        raise ValueError('No combo of the hero range can meet one of the villain range')
+    with np.errstate(invalid='ignore', divide='ignore'):
+        combo_equities = scores / faced
+    return RangeEquity(float(np.dot(hero.weights, scores) / total), hero.combos, combo_equities, n_runouts)
@@ -0,0 +1,124 @@
+"""
+The evaluator tables of the batch module published once in shared memory. The parent process
+creates a segment holding the rank arrays and the flush array, and pool workers attach to it and
+use read-only NumPy views of the same pages instead of building or unpickling their own copies.
+
+    with shared.pool(processes) as workers:
+        workers.map(function, jobs)
+"""
+import collections
+import contextlib
+import multiprocessing
+from multiprocessing import shared_memory
+import numpy as np
+import batch
+
+
+# Offsets of the arrays in a segment are aligned to cache lines
+_ALIGNMENT = 64
+_TABLE_SIZES = tuple(range(1, 8))
+
+TableSpec = collections.namedtuple('TableSpec', ['name', 'arrays'])
+TableSpec.__doc__ = '''The picklable description of a segment: its name and (key, dtype, offset, length) of every
+array, the key is a number of cards for a rank array or 'flush' for the flush array'''
+
+_attached = []
+
+
+class SharedTables(object):
+    """
+    The SharedTables class is a shared memory segment holding evaluator tables. It is created once
+    by the parent, which owns and finally unlinks it, and attached by workers from its spec.
+    """
+    def __init__(self, segment, spec, owner):
+        self.segment = segment
+        self.spec = spec
+        self.owner = owner
+        self.arrays = {}
+        for key, dtype, offset, length in spec.arrays:
+            array = np.ndarray(length, dtype=dtype, buffer=segment.buf, offset=offset)
+            if not owner:
+                array.setflags(write=False)
+            self.arrays[key] = array
+
+    @classmethod
+    def create(cls, n_cards=_TABLE_SIZES):
+        '''
+        Builds the tables and copies them into a new segment
+        :param n_cards: the hand sizes whose rank arrays are published
+        :return the owning SharedTables
+        '''
+        tables = [(size, batch.rank_array(size)) for size in n_cards] + [('flush', batch.flush_array())]
+        layout, size = [], 0
+        for key, table in tables:
+            layout.append((key, table.dtype.str, size, len(table)))
+            size += -(-table.nbytes // _ALIGNMENT) * _ALIGNMENT
+        segment = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        shared = cls(segment, TableSpec(segment.name, layout), owner=True)
+        for key, table in tables:
+            shared.arrays[key][:] = table
+        return shared
+
+    @classmethod
+    def attach(cls, spec):
+        '''
+        Attaches to a segment created by another process
+        :param spec: the TableSpec of the segment
+        :return a read-only SharedTables
+        '''
+        return cls(shared_memory.SharedMemory(name=spec.name), spec, owner=False)
+
+    def install(self):
+        '''Makes the batch evaluator of this process use the shared arrays'''
+        for key, array in self.arrays.items():
+            batch.install_array(key, array)
+
+    def uninstall(self):
+        '''Removes the shared arrays from the batch evaluator, which rebuilds its own on demand'''
+        for key, array in self.arrays.items():
+            batch.uninstall_array(key, array)
+
+    def close(self):
+        '''Detaches this process from the segment, the views must not be used afterwards'''
+        self.uninstall()
+        self.arrays.clear()
+        self.segment.close()
+
+    def unlink(self):
+        '''Closes the segment and, in its owner, frees it once every process has detached'''
+        self.close()
+        if self.owner:
+            self.segment.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.unlink()
+
+
+def attach_worker(spec):
+    '''Pool initializer attaching the worker to a segment and installing its tables'''
+    tables = SharedTables.attach(spec)
+    tables.install()
+    _attached.append(tables)
+
+
+@contextlib.contextmanager
+def pool(processes, tables=None, n_cards=_TABLE_SIZES):
+    '''
+    Starts a multiprocessing.Pool whose workers use the shared tables
+    :param processes: number of worker processes
+    :param tables: an existing SharedTables, else the tables are created and freed with the pool
+    :param n_cards: the hand sizes whose rank arrays are created, if tables is None
+    :return a context manager giving the pool
+    '''
+    owned = tables is None
+    if owned:
+        tables = SharedTables.create(n_cards)
+    try:
+        with multiprocessing.Pool(processes, initializer=attach_worker, initargs=(tables.spec,)) as workers:
+            yield workers
+    finally:
+        if owned:
+            tables.unlink()
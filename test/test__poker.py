@@ -1,4 +1,6 @@
+import itertools
 from nose.tools import assert_raises
+import numpy as np
 import poker
 
 
@@ -84,3 +86,175 @@ def test_full_round():
 
 
 
+
+
+def test_evaluate():
+    royal = [poker.encode_card(value, poker.Suit.Spades) for value in range(10, 15)]
+    strength = poker.evaluate(royal)
+    assert poker.strength_combo(strength) == poker.CardCombo.straightflush
+    assert poker.strength_values(strength) == [14]
+
+    wheel = [poker.encode_card(14, poker.Suit.Hearts)] + [poker.encode_card(value, poker.Suit.Clubs) for value in range(2, 6)]
+    assert poker.strength_values(poker.evaluate(wheel)) == [5]
+    assert poker.evaluate(wheel) < poker.evaluate(royal)
+
+
+def test_evaluate_repeated_cards():
+    for cards in ([0] * 5, [0, 0, 1, 2, 3, 4, 5], [0] * 9):
+        with assert_raises(ValueError):
+            poker.evaluate(cards)
+
+
+def test_evaluate_matches_check_poker_hand():
+    deck = poker.Deck()
+    np.random.seed(2)
+    for i in range(200):
+        deck.shuffle_deck()
+        for n in (5, 7):
+            codes = list(deck.codes[:n])
+            strength = poker.evaluate(codes)
+            card_combo, card_values = poker.PlayerHand.check_poker_hand(codes)
+            assert poker.strength_combo(strength) == card_combo
+            assert poker.strength_values(strength) == card_values
+
+
+def test_pack_strength():
+    strength = poker.pack_strength(poker.CardCombo.twopair, [13, 9, 4])
+    assert poker.strength_combo(strength) == poker.CardCombo.twopair
+    assert poker.strength_values(strength) == [13, 9, 4]
+    assert strength < poker.pack_strength(poker.CardCombo.twopair, [13, 10, 2])
+
+
+def test_hand_state():
+    hand = poker.PlayerHand()
+    hand.give_card(poker.AceCard(poker.Suit.Spades))
+    hand.give_card(poker.KingCard(poker.Suit.Spades))
+    flop = [poker.encode_card(value, poker.Suit.Spades) for value in (2, 7, 9)]
+    for code in flop:
+        hand.give_card(code)
+    assert hand.state.evaluate() == poker.evaluate(hand.codes)
+
+    turn = hand.state.fork()
+    turn.add(poker.encode_card(13, poker.Suit.Hearts))
+    assert poker.strength_combo(turn.evaluate()) == poker.CardCombo.flush
+    assert hand.state.n_cards == 5
+
+    unseen = [code for code in range(poker.N_CARDS) if code not in hand.codes]
+    assert hand.state.next_strengths(unseen) == [poker.evaluate(hand.codes + [code]) for code in unseen]
+
+    hand.remove_card([0, 1])
+    assert hand.state.evaluate() == poker.evaluate(flop)
+    with assert_raises(ValueError):
+        hand.state.remove(poker.encode_card(14, poker.Suit.Spades))
+
+
+def test_hand_state_repeated_card():
+    hand = poker.PlayerHand()
+    hand.give_card(0)
+    with assert_raises(ValueError):
+        hand.give_card(0)
+    assert hand.codes == [0] and hand.state.n_cards == 1
+    with assert_raises(ValueError):
+        hand.best_poker_hand([0, 13, 26])
+    hand.remove_card(0)
+    assert hand.codes == [] and hand.mask == 0 and hand.state.n_cards == 0
+
+
+def test_pokerhand_key():
+    pair = poker.PokerHand(poker.CardCombo.onepair, [10, 14, 9, 3])
+    same = poker.PokerHand.from_strength(pair.key)
+    assert pair == same
+    assert len({pair, same}) == 1
+    assert pair < poker.PokerHand(poker.CardCombo.onepair, [10, 14, 9, 4])
+    assert pair > poker.PokerHand(poker.CardCombo.highcard, [14, 13, 12, 11, 9])
+    assert sorted([pair, poker.PokerHand(2, [3, 2, 4])])[0] is pair
+
+
+def test_showdown():
+    board = [poker.encode_card(value, poker.Suit.Clubs) for value in (2, 7, 9)] + [poker.encode_card(13, poker.Suit.Hearts), poker.encode_card(5, poker.Suit.Clubs)]
+    hands = [[poker.AceCard(poker.Suit.Spades), poker.AceCard(poker.Suit.Diamonds)],
+             [poker.KingCard(poker.Suit.Spades), poker.QueenCard(poker.Suit.Diamonds)],
+             [poker.AceCard(poker.Suit.Hearts), poker.AceCard(poker.Suit.Clubs)],
+             [poker.NumberedCard(3, poker.Suit.Spades), poker.NumberedCard(4, poker.Suit.Diamonds)]]
+    result = poker.showdown(hands, board)
+    assert result.winners == [2]
+    assert result.order == [2, 0, 1, 3]
+    assert result.ranks == [1, 2, 0, 3]
+
+
+def test_best_poker_hand_cache():
+    cache = poker.LRUCache()
+    hand = poker.PlayerHand(n_hole=2)
+    for code in poker.parse_cards('As Ah Kd Qc'):
+        hand.give_card(code)
+    hand.best_poker_hand(poker.parse_cards('2h 7h Jh'), cache)
+    first = hand.pokerhand
+    other = poker.PlayerHand(n_hole=2)
+    for code in poker.parse_cards('Ac Ad Ks Qh'):
+        other.give_card(code)
+    other.best_poker_hand(poker.parse_cards('2c 7c Jc'), cache)
+    assert other.pokerhand == first
+    assert cache.stats()['hits'] == 1
+
+    holdem = poker.PlayerHand()
+    holdem.give_card(poker.AceCard(poker.Suit.Spades))
+    holdem.give_card(poker.AceCard(poker.Suit.Hearts))
+    with assert_raises(ValueError):
+        holdem.best_poker_hand([0, 5, 9], cache)
+    assert len(cache) == 1
+
+
+def test_evaluate_exact():
+    hole = poker.parse_cards('As Ks Qs 2d')
+    board = poker.parse_cards('Js Ts 3c 4c 9h')
+    assert poker.strength_combo(poker.evaluate(hole + board)) == poker.CardCombo.straightflush
+    assert poker.strength_combo(poker.evaluate_exact(hole, board)) == poker.CardCombo.straight
+    assert poker.strength_values(poker.evaluate_exact(hole, board)) == [13]
+    board = poker.parse_cards('5h 5d 5c 7c 8c')
+    assert poker.strength_combo(poker.evaluate_exact(hole, board)) == poker.CardCombo.threeofakind
+    with assert_raises(ValueError):
+        poker.evaluate_exact(hole[:1], board)
+
+    rng = np.random.default_rng(0)
+    for cards in poker.deal_cards(300, 9, rng):
+        cards = [int(code) for code in cards]
+        expected = max(poker.evaluate(list(two) + list(three)) for two in itertools.combinations(cards[:4], 2)
+                       for three in itertools.combinations(cards[4:], 3))
+        assert poker.evaluate_exact(cards[:4], cards[4:]) == expected
+
+
+def test_best_poker_hand_n_hole():
+    cache = poker.LRUCache()
+    hand = poker.PlayerHand(n_hole=2)
+    for code in poker.parse_cards('Ah Kh Qd 2c'):
+        hand.give_card(code)
+    hand.best_poker_hand(poker.parse_cards('Th Jh 3h 3c 3d'), cache)
+    assert hand.card_combo == poker.CardCombo.flush
+    assert hand.card_values == [14, 13, 11, 10, 3]
+    hand.best_poker_hand(poker.parse_cards('Ts Js 3h 3c 3d'), cache)
+    assert hand.card_combo == poker.CardCombo.threeofakind
+    assert poker.showdown([hand.codes, poker.parse_cards('3s 4s 5c 6c')], poker.parse_cards('Ts Js 3h 3c 3d'),
+                          n_hole=2).winners == [1]
+
+
+def test_instrumentation():
+    instrumentation = poker.enable_instrumentation()
+    try:
+        hand = poker.PlayerHand()
+        hand.give_card(poker.AceCard(poker.Suit.Spades))
+        hand.give_card(poker.AceCard(poker.Suit.Diamonds))
+        hand.best_poker_hand([0, 5, 9])
+        hand.best_poker_hand([poker.encode_card(14, poker.Suit.Clubs), 5, 9])
+        assert poker.active_instrumentation() is instrumentation
+        snapshot = poker.instrumentation_snapshot()
+    finally:
+        final = poker.disable_instrumentation()
+    assert snapshot['hands'] == 2
+    assert snapshot['combos']['onepair'] == 1
+    assert snapshot['combos']['threeofakind'] == 1
+    for phase in ('count', 'lookup', 'pokerhand'):
+        assert snapshot['phases'][phase]['calls'] == 2
+        assert sum(snapshot['phases'][phase]['histogram'].values()) == 2
+    assert final['hands'] == 2
+    hand.best_poker_hand([])
+    assert poker.instrumentation_snapshot() is None
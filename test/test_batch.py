@@ -0,0 +1,123 @@
+import itertools
+from nose.tools import assert_raises
+import numpy as np
+import poker
+import batch
+
+
+def random_hands(n_hands, n_cards, seed=0):
+    rng = np.random.default_rng(seed)
+    return np.argsort(rng.random((n_hands, poker.N_CARDS)), axis=1)[:, :n_cards]
+
+
+def test_evaluate_batch():
+    for n_cards in (5, 6, 7):
+        hands = random_hands(500, n_cards)
+        strengths, combos = batch.evaluate_batch(hands, combos=True)
+        assert strengths.shape == (500,)
+        for hand, strength, combo in zip(hands, strengths, combos):
+            assert strength == poker.evaluate(list(hand))
+            assert combo == poker.strength_combo(strength)
+
+
+def test_evaluate_batch_flushes():
+    royal = [poker.encode_card(value, poker.Suit.Diamonds) for value in range(10, 15)]
+    hands = np.array([royal + [0, 1], [0, 1, 2, 3, 4, 5, 6]])
+    strengths, combos = batch.evaluate_batch(hands, combos=True)
+    assert list(combos) == [poker.CardCombo.straightflush, poker.CardCombo.straightflush]
+    assert strengths[0] > strengths[1]
+
+
+def test_evaluate_batch_shape():
+    with assert_raises(ValueError):
+        batch.evaluate_batch(np.zeros((3, 8), dtype=int))
+    with assert_raises(ValueError):
+        batch.evaluate_batch(np.zeros(7, dtype=int))
+    with assert_raises(ValueError):
+        batch.evaluate_batch([[-1, 47, 46, 45, 44]])
+    with assert_raises(ValueError):
+        batch.evaluate_batch([[0, 1, 2, 3, 52]])
+
+
+def test_evaluate_masks():
+    for n_cards in (3, 5, 7):
+        hands = random_hands(500, n_cards)
+        masks = batch.hand_masks(hands)
+        assert (batch.evaluate_masks(masks) == batch.evaluate_batch(hands)).all()
+        assert (batch.mask_cards(masks, n_cards) == np.sort(hands, axis=1)).all()
+    mixed = np.concatenate([batch.hand_masks(random_hands(20, 5)), batch.hand_masks(random_hands(20, 7))])
+    assert list(batch.evaluate_masks(mixed)) == [poker.evaluate_mask(int(mask)) for mask in mixed]
+    with assert_raises(ValueError):
+        batch.evaluate_masks(batch.hand_masks(random_hands(3, 8)))
+    uneven = np.array([(1 << 6) - 1, ((1 << 8) - 1) << 10], dtype=np.uint64)
+    with assert_raises(ValueError):
+        batch.mask_cards(uneven, 7)
+
+
+def test_hand_masks_repeated_card():
+    masks = batch.hand_masks([[0, 0, 2, 3, 4, 5, 6], [0, 1, 2, 3, 4, 5, 6]])
+    assert list(masks) == [0b1111101, 0b1111111]
+    assert list(batch.mask_sizes(masks)) == [6, 7]
+
+
+def test_evaluate_exact():
+    hands = random_hands(500, 9)
+    strengths = batch.evaluate_exact(hands[:, :4], hands[:, 4:])
+    for hand, strength in zip(hands, strengths):
+        assert strength == poker.evaluate_exact(list(hand[:4]), list(hand[4:]))
+    suited = np.array([np.random.default_rng(i).permutation(26)[:9] for i in range(200)])
+    strengths = batch.evaluate_exact(suited[:, :4], suited[:, 4:])
+    assert all(strength == poker.evaluate_exact(list(hand[:4]), list(hand[4:])) for hand, strength in zip(suited, strengths))
+    with assert_raises(ValueError):
+        batch.evaluate_exact(hands[:, :1], hands[:, 4:])
+
+
+def test_combinations():
+    combos = batch.combinations(6, 3)
+    assert [tuple(row) for row in combos] == list(itertools.combinations(range(6), 3))
+    assert batch.combinations(47, 2).shape == (1081, 2)
+    assert batch.combinations(2, 3).shape == (0, 3)
+
+
+def test_shuffled_decks():
+    decks = batch.shuffled_decks(100, np.random.default_rng(0), dead=[0, 51])
+    assert decks.shape == (100, 50)
+    assert all(sorted(deck) == list(range(1, 51)) for deck in decks)
+    again = batch.shuffled_decks(100, np.random.default_rng(0), dead=[0, 51])
+    assert (decks == again).all()
+
+
+def test_deal_hands():
+    board = [0, 1, 2]
+    holes, boards = batch.deal_hands(1000, 3, np.random.default_rng(1), board=board, dead=[3])
+    assert holes.shape == (1000, 3, 2)
+    assert boards.shape == (1000, 5)
+    assert (boards[:, :3] == board).all()
+    dealt = np.hstack([holes.reshape(1000, 6), boards])
+    assert all(len(set(row)) == 11 and 3 not in row for row in dealt)
+    with assert_raises(ValueError):
+        batch.deal_cards(1, 53, np.random.default_rng())
+
+
+def test_showdown_batch():
+    rng = np.random.default_rng(4)
+    holes, boards = batch.deal_hands(200, 4, rng)
+    result = batch.showdown_batch(holes, boards)
+    for table in range(200):
+        expected = poker.showdown(list(holes[table]), list(boards[table]))
+        assert list(result.strengths[table]) == expected.strengths
+        assert list(np.flatnonzero(result.winners[table])) == expected.winners
+        assert list(result.order[table]) == expected.order
+        assert list(result.ranks[table]) == expected.ranks
+
+
+def test_evaluate_batch_instrumentation():
+    poker.enable_instrumentation()
+    try:
+        strengths = batch.evaluate_batch(random_hands(1000, 7))
+    finally:
+        snapshot = poker.disable_instrumentation()
+    assert snapshot['hands'] == 1000
+    assert snapshot['phases']['batch']['calls'] == 1
+    assert sum(snapshot['combos'].values()) == 1000
+    assert snapshot['combos']['highcard'] == np.count_nonzero(strengths >> poker.STRENGTH_SHIFT == 0)
@@ -0,0 +1,22 @@
+import benchmark
+
+
+def test_run():
+    results = benchmark.run(['Deck()', 'PokerHand sort'], repeat=2)
+    assert sorted(results['benchmarks']) == ['Deck()', 'PokerHand sort']
+    for result in results['benchmarks'].values():
+        assert result['ops_per_sec'] > 0
+        assert result['p50'] <= result['p99']
+
+
+def test_compare():
+    results = {'benchmarks': {'a': {'p50': 2.0}, 'b': {'p50': 1.0}, 'c': {'p50': 1.0}}}
+    baseline = {'benchmarks': {'a': {'p50': 1.0}, 'b': {'p50': 1.0}}}
+    ratios, regressions = benchmark.compare(results, baseline)
+    assert ratios == {'a': 2.0, 'b': 1.0}
+    assert regressions == ['a']
+
+
+def test_import_time():
+    results = benchmark.run(['import poker'], repeat=1)
+    assert results['benchmarks']['import poker']['p50'] > 0
@@ -0,0 +1,71 @@
+from nose.tools import assert_raises
+import numpy as np
+import poker
+import batch
+import boardtable
+import ranges
+
+
+def test_board_table():
+    board = poker.parse_cards('5c Kc Jd Jc Jh')
+    table = boardtable.board_table(board, cache=None)
+    assert len(table) == 1081
+    assert np.all(np.diff(table.strengths) >= 0)
+    hands = np.hstack([table.pairs, np.tile(np.array(board, dtype=np.int8), (len(table), 1))])
+    assert np.array_equal(table.strengths, batch.evaluate_batch(hands))
+    assert table.lookup(poker.parse_cards('As Ad')) == poker.evaluate(poker.parse_cards('As Ad') + board)
+    assert np.array_equal(table.rank(table.pairs), np.searchsorted(table.strengths, table.strengths))
+    with assert_raises(ValueError):
+        table.lookup(poker.parse_cards('Kc Ad'))
+    with assert_raises(ValueError):
+        table.lookup(poker.parse_cards('Ad Ad'))
+
+
+def test_board_table_outcomes():
+    board = poker.parse_cards('Ah 7d 2c 9s Kd')
+    table = boardtable.board_table(board, cache=None)
+    holes = np.array([poker.parse_cards(hole) for hole in ('As Ad', '3h 4h', '7h 7c', 'Ks Qs')])
+    better, tied, worse = table.outcomes(holes)
+    for hole, counts in zip(holes.tolist(), zip(better, tied, worse)):
+        strength = poker.evaluate(hole + board)
+        others = [poker.evaluate(pair + board) for pair in table.pairs.tolist() if not set(pair) & set(hole)]
+        assert counts == (sum(other > strength for other in others), sum(other == strength for other in others),
+                          sum(other < strength for other in others))
+    assert better[0] == 0
+    assert abs(table.hand_strength(poker.parse_cards('As Ad')) - 1) < 1e-9
+
+
+def test_board_table_showdown():
+    board = poker.parse_cards('5c Kc Jd Jc Jh')
+    holes = np.array([[poker.parse_cards('As Ad'), poker.parse_cards('Kh Kd'), poker.parse_cards('2s 3s')]])
+    result = boardtable.board_table(board).showdown(holes)
+    expected = batch.showdown_batch(holes, np.array([board]))
+    for field, value in zip(result, expected):
+        assert np.array_equal(field, value)
+    assert result.winners.tolist() == [[False, True, False]]
+
+
+def test_board_table_cache():
+    cache = poker.LRUCache()
+    first = boardtable.board_table(poker.parse_cards('Ah 7d 2c 9s Kd'), cache)
+    second = boardtable.board_table(poker.parse_cards('Kd 9s 2c 7d Ah'), cache)
+    assert first is second
+    assert cache.stats()['hits'] == 1
+    with assert_raises(ValueError):
+        boardtable.board_table(poker.parse_cards('Ah 7d 2c 9s'))
+
+
+def test_range_equity_river():
+    board = poker.parse_cards('Ah 7d 2c 9s Kd')
+    result = ranges.range_equity('QQ+, AKs', 'JJ, 99', board)
+    hero, villain = ranges.parse_range('QQ+, AKs', board), ranges.parse_range('JJ, 99', board)
+    wins = total = 0
+    for first in hero.combos.tolist():
+        for second in villain.combos.tolist():
+            if set(first) & set(second):
+                continue
+            mine, theirs = poker.evaluate(first + board), poker.evaluate(second + board)
+            wins += (mine > theirs) + (mine == theirs) / 2.
+            total += 1
+    assert result.runouts == 1
+    assert abs(result.equity - wins / total) < 1e-9
@@ -1,3 +1,152 @@
+import os
+import pickle
+import subprocess
+import sys
+from nose.tools import assert_raises
+import numpy as np
+import poker
 
 
+def test_encode_card():
+    assert poker.encode_card(2, poker.Suit.Hearts) == 0
+    assert poker.encode_card(14, poker.Suit.Clubs) == 51
+    card = poker.QueenCard(poker.Suit.Spades)
+    assert poker.card_value(card.code) == 12
+    assert poker.card_suit(card.code) == poker.Suit.Spades
 
+
+def test_decode_card():
+    for code in range(poker.N_CARDS):
+        card = poker.decode_card(code)
+        assert isinstance(card, poker.PlayingCard)
+        assert card.code == code
+    assert isinstance(poker.decode_card(12), poker.AceCard)
+
+
+def test_hand_mask():
+    codes = [0, 13, 51]
+    mask = poker.hand_mask(codes)
+    assert mask == 1 | 1 << 13 | 1 << 51
+    assert poker.mask_codes(mask) == codes
+
+
+def test_deck_codes():
+    deck = poker.Deck()
+    assert sorted(deck.codes) == list(range(poker.N_CARDS))
+    top_code = deck.codes[-1]
+    assert deck.take_top_card().code == top_code
+    assert len(deck.codes) == 51
+
+
+def test_playerhand_codes():
+    hand = poker.PlayerHand()
+    hand.give_card(poker.AceCard(poker.Suit.Spades))
+    hand.give_card(poker.NumberedCard(10, poker.Suit.Clubs))
+    assert hand.codes == [38, 47]
+    assert hand.mask == 1 << 38 | 1 << 47
+    hand.remove_card(0)
+    assert hand.codes == [47]
+    assert hand.mask == 1 << 47
+    assert hand.cards[0].value == 10
+
+
+def test_shuffle_deck_rng():
+    first, second = poker.Deck(), poker.Deck()
+    first.shuffle_deck(np.random.default_rng(3))
+    second.shuffle_deck(np.random.default_rng(3))
+    assert list(first.codes) == list(second.codes)
+    assert sorted(first.codes) == list(range(poker.N_CARDS))
+
+
+def test_deck_deal():
+    deck = poker.Deck()
+    top_codes = list(deck.codes[-3:][::-1])
+    assert list(deck.deal(3)) == top_codes
+    assert len(deck) == 49
+    assert deck.take_top_card().code == 48
+    with assert_raises(ValueError):
+        deck.deal(49)
+    with assert_raises(ValueError):
+        deck.deal(-2)
+    assert len(deck) == 48
+    assert deck.deal(0) == []
+    dealt = deck.deal(48)
+    assert len(dealt) == 48 and len(deck) == 0
+    assert deck.deal(0) == []
+
+
+def test_deck_remove_cards():
+    deck = poker.Deck()
+    deck.remove_cards([poker.AceCard(poker.Suit.Clubs), 0])
+    assert len(deck) == 50
+    assert list(deck.codes) == list(range(1, 51))
+    with assert_raises(ValueError):
+        deck.remove_cards(0)
+
+
+def test_deck_reset():
+    deck = poker.Deck()
+    deck.remove_cards([5, 6])
+    deck.deal(10)
+    deck.reset(np.random.default_rng(1), shuffle=True)
+    assert len(deck) == 52
+    assert sorted(deck.codes) == list(range(poker.N_CARDS))
+
+
+def test_canonical_form():
+    hole = [poker.encode_card(14, poker.Suit.Spades), poker.encode_card(13, poker.Suit.Spades)]
+    board = [poker.encode_card(2, poker.Suit.Hearts), poker.encode_card(7, poker.Suit.Spades)]
+    relabelled_hole = [poker.encode_card(14, poker.Suit.Clubs), poker.encode_card(13, poker.Suit.Clubs)]
+    relabelled_board = [poker.encode_card(2, poker.Suit.Diamonds), poker.encode_card(7, poker.Suit.Clubs)]
+    assert poker.canonical_form(hole, board) == poker.canonical_form(relabelled_hole, relabelled_board)
+    assert poker.canonical_form(hole, board) != poker.canonical_form(board, hole)
+    offsuit = [poker.encode_card(14, poker.Suit.Spades), poker.encode_card(13, poker.Suit.Hearts)]
+    assert poker.canonical_form(hole, board) != poker.canonical_form(offsuit, board)
+
+
+def test_lru_cache():
+    cache = poker.LRUCache(maxsize=2)
+    assert cache.lookup('a', lambda: 1) == 1
+    assert cache.lookup('b', lambda: 2) == 2
+    assert cache.lookup('a', lambda: 3) == 1
+    cache.lookup('c', lambda: 4)
+    assert cache.lookup('b', lambda: 5) == 5
+    assert cache.stats() == {'hits': 1, 'misses': 4, 'evictions': 2, 'size': 2, 'maxsize': 2}
+
+
+def test_interned_cards():
+    card = poker.NumberedCard(7, poker.Suit.Clubs)
+    assert card is poker.NumberedCard(7, poker.Suit.Clubs)
+    assert card is poker.decode_card(card.code)
+    assert card is pickle.loads(pickle.dumps(card))
+    assert all(a is b for a, b in zip(poker.Deck().deck, poker.Deck().deck))
+    assert not hasattr(card, '__dict__')
+    with assert_raises(AttributeError):
+        card.value = 8
+    with assert_raises(ValueError):
+        poker.NumberedCard(11, poker.Suit.Clubs)
+
+
+def test_card_hashing():
+    aces = {poker.AceCard(suit) for suit in poker.Suit}
+    assert len(aces) == 4
+    assert poker.AceCard(poker.Suit.Hearts) in aces
+    assert poker.AceCard(poker.Suit.Hearts) != poker.AceCard(poker.Suit.Spades)
+    cards = [poker.decode_card(code) for code in range(poker.N_CARDS)]
+    assert [card.code for card in sorted(cards, key=lambda card: card.key)][:4] == [0, 13, 26, 39]
+
+
+def test_card_ordering():
+    hearts, spades = poker.AceCard(poker.Suit.Hearts), poker.AceCard(poker.Suit.Spades)
+    assert hearts < spades and hearts <= spades and spades > hearts and spades >= hearts
+    assert not spades < hearts and hearts != spades
+    assert poker.KingCard(poker.Suit.Clubs) < hearts
+    cards = [poker.decode_card(code) for code in range(poker.N_CARDS)]
+    assert sorted(cards) == sorted(reversed(cards)) == sorted(cards, key=lambda card: card.key)
+
+
+def test_import_without_numpy():
+    code = ('import sys, poker; hand = poker.PlayerHand(); hand.give_card(poker.AceCard(poker.Suit.Clubs)); '
+            'hand.best_poker_hand([0, 1, 2, 3]); deck = poker.Deck(); deck.deal(5); '
+            'assert "numpy" not in sys.modules; poker.evaluate_batch; assert "numpy" in sys.modules')
+    subprocess.check_call([sys.executable, '-c', code], cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
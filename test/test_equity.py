@@ -0,0 +1,126 @@
+from nose.tools import assert_raises
+import poker
+import equity
+import shared
+
+
+def test_monte_carlo_equity():
+    result = equity.monte_carlo_equity(poker.parse_cards('As Ah'), [poker.parse_cards('Ks Kh')], trials=20000,
+                                       processes=1, seed=1)
+    assert abs(result.win - 0.82) < 0.02
+    assert abs(result.win + result.tie + result.loss - 1) < 1e-9
+    assert result.trials == 20000
+
+
+def test_monte_carlo_equity_reproducible():
+    hero = poker.parse_cards('7c 2d')
+    first = equity.monte_carlo_equity(hero, n_villains=2, trials=40000, processes=2, seed=5)
+    second = equity.monte_carlo_equity(hero, n_villains=2, trials=40000, processes=1, seed=5)
+    assert first == second
+    with shared.pool(3, n_cards=(7,)) as workers:
+        assert equity.monte_carlo_equity(hero, n_villains=2, trials=40000, seed=5, pool=workers) == first
+    chunked = equity.monte_carlo_equity(hero, n_villains=2, trials=40000, processes=1, seed=5, chunk_trials=5000)
+    assert chunked.trials == 40000 and chunked != first
+
+
+def test_monte_carlo_equity_river():
+    board = poker.parse_cards('Ks Qs Js Ts 2c')
+    result = equity.monte_carlo_equity(poker.parse_cards('As 3h'), board=board, trials=1000, processes=1, seed=0)
+    assert result.win == 1
+
+
+def test_monte_carlo_equity_duplicates():
+    with assert_raises(ValueError):
+        equity.monte_carlo_equity(poker.parse_cards('As Ah'), [poker.parse_cards('As Kh')], trials=10, processes=1)
+
+
+def test_exact_equity_flop():
+    board = poker.parse_cards('2c 7d 9s')
+    result = equity.exact_equity(poker.parse_cards('As Ah'), [poker.parse_cards('Kd Kc')], board)
+    assert result.trials == 990
+    assert abs(result.win - 907 / 990.) < 1e-9
+    assert result.tie == 0
+
+
+def test_exact_equity_river():
+    board = poker.parse_cards('As Ks Qs Js Ts')
+    villains = [poker.parse_cards('4d 5h'), poker.parse_cards('6d 7h')]
+    result = equity.exact_equity(poker.parse_cards('2d 3h'), villains, board)
+    assert result == equity.Equity(0, 1, 0, 1)
+
+
+def test_exact_equity_needs_villains():
+    with assert_raises(ValueError):
+        equity.exact_equity(poker.parse_cards('As Ah'), [])
+
+
+def test_exact_equity_cache():
+    cache = poker.LRUCache()
+    first = equity.exact_equity(poker.parse_cards('As Ah'), [poker.parse_cards('Kd Kc')], poker.parse_cards('2c 7d 9s'),
+                                cache=cache)
+    second = equity.exact_equity(poker.parse_cards('Ac Ad'), [poker.parse_cards('Ks Kh')], poker.parse_cards('2s 7h 9c'),
+                                 cache=cache)
+    assert first == second
+    assert cache.stats()['hits'] == 1
+
+
+def test_adaptive_equity():
+    result = equity.adaptive_equity(poker.parse_cards('As Ah'), [poker.parse_cards('Ks Kh')], precision=0.005, seed=1)
+    assert result.converged
+    assert abs(result.equity - 0.82) < 0.01
+    assert result.low <= result.equity <= result.high
+    assert result.high - result.low <= 0.01 + 1e-9
+    assert abs(result.win + result.tie + result.loss - 1) < 1e-9
+
+
+def test_adaptive_equity_flop():
+    hero, villain, board = poker.parse_cards('As Ah'), poker.parse_cards('Kd Kc'), poker.parse_cards('2c 7d 9s')
+    exact = equity.exact_equity(hero, [villain], board)
+    result = equity.adaptive_equity(hero, [villain], board=board, seed=2)
+    assert abs(result.equity - exact.win) < 0.01
+
+
+def test_adaptive_equity_river():
+    board = poker.parse_cards('Ks Qs Js Ts 2c')
+    result = equity.adaptive_equity(poker.parse_cards('As 3h'), board=board, seed=0)
+    assert result.converged
+    assert result.equity == result.win == 1
+    assert result.trials == equity.MIN_TRIALS
+
+
+def test_adaptive_equity_limits():
+    result = equity.adaptive_equity(poker.parse_cards('7c 2d'), n_villains=3, precision=1e-4, max_trials=3000, seed=3)
+    assert not result.converged
+    assert result.trials == 3000
+    result = equity.adaptive_equity(poker.parse_cards('7c 2d'), n_villains=3, precision=1e-4, time_budget=0, seed=3)
+    assert not result.converged
+    assert result.trials == equity.MIN_TRIALS
+
+
+def test_adaptive_equity_stratified():
+    board = poker.parse_cards('Jh Th 2c')
+    hero, villain = poker.parse_cards('9h 8h'), poker.parse_cards('As Ad')
+    plain = equity.adaptive_equity(hero, [villain], board=board, precision=0, max_trials=20000, stratify=False, seed=4)
+    stratified = equity.adaptive_equity(hero, [villain], board=board, precision=0, max_trials=20000, seed=4)
+    assert stratified.standard_error < plain.standard_error
+
+
+def test_adaptive_equity_duplicates():
+    with assert_raises(ValueError):
+        equity.adaptive_equity(poker.parse_cards('As Ah'), [poker.parse_cards('As Kh')])
+
+
+def test_equity_needs_two_hole_cards():
+    with assert_raises(ValueError):
+        equity.monte_carlo_equity(poker.parse_cards('As'), trials=100, processes=1)
+    with assert_raises(ValueError):
+        equity.exact_equity(poker.parse_cards('As Ah'), [poker.parse_cards('Kd')])
+    with assert_raises(ValueError):
+        equity.adaptive_equity([], n_villains=1)
+
+
+def test_equity_needs_trials():
+    with assert_raises(ValueError):
+        equity.monte_carlo_equity(poker.parse_cards('As Ah'), trials=0, processes=1)
+    with assert_raises(ValueError):
+        equity.adaptive_equity(poker.parse_cards('As Ah'), max_trials=0)
@@ -0,0 +1,49 @@
+import os
+import tempfile
+from nose.tools import assert_raises
+import numpy as np
+import batch
+import handfile
+
+
+def test_write_and_map():
+    rng = np.random.default_rng(0)
+    hands = batch.deal_cards(5000, 7, rng)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'hands.bin')
+        assert handfile.write_hands(path, hands) == 5000
+        assert os.path.getsize(path) == 16 + 5000 * (8 + 4)
+
+        mapped = handfile.HandFile(path)
+        assert len(mapped) == 5000
+        assert isinstance(mapped.masks, np.memmap)
+        assert (mapped.masks == batch.hand_masks(hands)).all()
+        assert (mapped.strengths == batch.evaluate_batch(hands)).all()
+        assert (mapped.evaluate(100, 200) == mapped.strengths[100:200]).all()
+        assert (mapped.cards(7, 10, 20) == np.sort(hands[10:20], axis=1)).all()
+
+
+def test_write_chunks():
+    rng = np.random.default_rng(1)
+    chunks = [batch.deal_cards(300, 5, rng) for _ in range(4)]
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'hands.bin')
+        assert handfile.write_hands(path, (chunk for chunk in chunks), strengths=False) == 1200
+        mapped = handfile.HandFile(path)
+        assert mapped.strengths is None
+        assert (mapped.evaluate() == batch.evaluate_batch(np.vstack(chunks))).all()
+
+
+def test_not_a_hand_file():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'other.bin')
+        with open(path, 'wb') as file:
+            file.write(b'\0' * 64)
+        with assert_raises(ValueError):
+            handfile.HandFile(path)
+
+
+def test_write_repeated_card():
+    with tempfile.TemporaryDirectory() as directory:
+        with assert_raises(ValueError):
+            handfile.write_hands(os.path.join(directory, 'hands.bin'), np.array([[0, 0, 2, 3, 4, 5, 6]]))
@@ -0,0 +1,79 @@
+import io
+import itertools
+import os
+import tempfile
+from nose.tools import assert_raises
+import numpy as np
+import poker
+import batch
+import handhistory
+
+
+def history(n_hands, seed=0):
+    hands = batch.deal_cards(n_hands, 7, np.random.default_rng(seed))
+    lines = ['hand%d\t%s | %s\n' % (i, ' '.join(map(poker.card_name, hand[:2])), ' '.join(map(poker.card_name, hand[2:])))
+             for i, hand in enumerate(hands)]
+    return hands, lines
+
+
+def test_parse_cards():
+    assert poker.parse_cards('As Kd') == [poker.parse_card('As'), poker.parse_card('Kd')]
+    assert poker.parse_cards('AsKd, Qh | 2c') == poker.parse_cards('As Kd Qh 2c')
+    assert poker.parse_cards('') == []
+    with assert_raises(ValueError):
+        poker.parse_cards('As Kx')
+    with assert_raises(ValueError):
+        poker.parse_cards('AsK')
+
+
+def test_process_matches_best_poker_hand():
+    hands, lines = history(300)
+    out = io.StringIO()
+    summary = handhistory.process(iter(lines), out, chunk_lines=64)
+    assert summary == handhistory.Summary(300, 0)
+    results = out.getvalue().splitlines()
+    assert len(results) == 300
+    for hand, result in zip(hands, results):
+        player = poker.PlayerHand()
+        player.give_card(poker.decode_card(hand[0]))
+        player.give_card(poker.decode_card(hand[1]))
+        player.best_poker_hand([poker.decode_card(code) for code in hand[2:]])
+        hand_id, strength, combo, values = result.split('\t')
+        assert int(strength) == player.strength
+        assert combo == player.card_combo.name
+        assert [int(value) for value in values.split()] == player.card_values
+
+
+def test_process_records():
+    lines = ['# header\n', '\n', 'Ks Kd Kh Kc Qs 2d 3d 4d 5d\n', 'x\tAh\n', 'y\tAh Ah\n']
+    with assert_raises(ValueError) as error:
+        handhistory.process(lines, io.StringIO())
+    assert 'Line 5' in str(error.exception)
+
+    out = io.StringIO()
+    assert handhistory.process(lines, out, skip_invalid=True) == handhistory.Summary(2, 1)
+    first, second = out.getvalue().splitlines()
+    assert first.split('\t')[0] == '3' and first.split('\t')[2] == 'fourofakind'
+    assert second.split('\t')[:1] + second.split('\t')[2:] == ['x', 'highcard', '14']
+
+
+def test_read_chunks_lazy():
+    endless = ('As Kd\n' for _ in itertools.count())
+    chunks = handhistory.read_chunks(endless, chunk_lines=10)
+    first_line, lines, _ = next(chunks)
+    assert first_line == 1 and len(lines) == 10
+    assert next(chunks)[0] == 11
+
+
+def test_process_file_pool():
+    _, lines = history(500, seed=1)
+    expected = io.StringIO()
+    handhistory.process(lines, expected)
+    with tempfile.TemporaryDirectory() as directory:
+        source = os.path.join(directory, 'hands.txt')
+        with open(source, 'w') as file:
+            file.writelines(lines)
+        target = os.path.join(directory, 'results.txt')
+        assert handhistory.process_file(source, target, chunk_lines=50, processes=2).hands == 500
+        with open(target) as file:
+            assert file.read() == expected.getvalue()
@@ -0,0 +1,86 @@
+import os
+import tempfile
+from nose.tools import assert_raises
+import numpy as np
+import poker
+import batch
+import boardtable
+import handstrength
+import ranges
+
+
+def test_street_boards():
+    boards, weights = handstrength.street_boards(3)
+    assert len(boards) == 1755
+    assert weights.sum() == 22100
+    assert (np.diff(batch.hand_masks(boards).astype(np.float64)) > 0).all()
+
+
+def test_hand_strengths():
+    boards = batch.deal_cards(10, 5, np.random.default_rng(0))
+    strengths = boardtable.hand_strengths(boards)
+    for board, row in zip(boards.tolist(), strengths):
+        table = boardtable.board_table(board, cache=None)
+        live = table.positions >= 0
+        assert np.isnan(row[~live]).all()
+        assert np.allclose(row[live], table.hand_strength(table.pairs[table.positions[live]]))
+
+
+def test_board_strengths():
+    board, hole = poker.parse_cards('Ah 7d 2c 9s'), poker.parse_cards('Ks Kd')
+    ehs, ehs2, histograms = handstrength.board_strengths(board)
+    pair = boardtable.PAIR_INDEX[hole[0], hole[1]]
+    everything = ranges.Range(batch.combinations(poker.N_CARDS, 2))
+    assert abs(ehs[pair] - ranges.range_equity(ranges.Range([hole]), everything, board).equity) < 1e-6
+    assert ehs[pair] ** 2 <= ehs2[pair] <= ehs[pair]
+    assert histograms[pair].sum() == 46
+    assert np.isnan(ehs[boardtable.PAIR_INDEX[hole[0], board[0]]])
+
+
+def test_compute_and_resume():
+    calls = []
+    with tempfile.TemporaryDirectory() as directory:
+        assert handstrength.compute('river', directory, processes=1, chunk_boards=16, stop=48,
+                                    progress=lambda done, total: calls.append((done, total))) == 3
+        assert calls == [(1, 3), (2, 3), (3, 3)]
+        os.remove(os.path.join(directory, 'river', 'chunk-00001.npz'))
+        assert handstrength.compute('river', directory, processes=1, chunk_boards=16, stop=48) == 1
+        strengths = handstrength.load(directory, 'river')
+        assert strengths.ehs.shape == (48, 1326)
+        assert strengths.histograms.shape == (48, 1326, handstrength.N_BINS)
+        with assert_raises(ValueError):
+            handstrength.compute('river', directory, processes=1, chunk_boards=8, stop=48)
+
+    with tempfile.TemporaryDirectory() as directory:
+        handstrength.compute('river', directory, processes=2, chunk_boards=16, stop=48)
+        assert np.array_equal(handstrength.load(directory, 'river').histograms, strengths.histograms)
+
+
+def test_lookup():
+    with tempfile.TemporaryDirectory() as directory:
+        handstrength.compute('turn', directory, processes=1, chunk_boards=1, stop=1)
+        strengths = handstrength.load(directory, 'turn')
+    board = [code + poker.N_RANKS for code in strengths.boards[0].tolist()]
+    hole = poker.parse_cards('Ah Kc')
+    ehs, ehs2, histogram = handstrength.lookup(strengths, board, hole)
+    direct = handstrength.board_strengths(board)
+    pair = boardtable.PAIR_INDEX[hole[0], hole[1]]
+    assert abs(ehs - direct[0][pair]) < 1e-6 and abs(ehs2 - direct[1][pair]) < 1e-6
+    assert np.array_equal(histogram, direct[2][pair])
+    with assert_raises(ValueError):
+        handstrength.lookup(strengths, poker.parse_cards('Ah 7d 2c 9s'), hole)
+
+
+def test_bucket():
+    with tempfile.TemporaryDirectory() as directory:
+        handstrength.compute('river', directory, processes=1, stop=64)
+        strengths = handstrength.load(directory, 'river')
+    result = handstrength.bucket(strengths, 5, seed=0)
+    valid = ~np.isnan(strengths.ehs)
+    assert result.centers.shape == (5, handstrength.N_BINS)
+    assert ((result.labels >= 0) == valid).all()
+    assert len(np.unique(result.labels[valid])) == 5
+    means = [strengths.ehs[valid][result.labels[valid] == label].mean() for label in range(5)]
+    spans = [(strengths.ehs[valid][result.labels[valid] == label].min(),
+              strengths.ehs[valid][result.labels[valid] == label].max()) for label in np.argsort(means)]
+    assert all(low[1] <= high[0] + 1. / handstrength.N_BINS for low, high in zip(spans, spans[1:]))
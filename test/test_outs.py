@@ -0,0 +1,49 @@
+from nose.tools import assert_raises
+import poker
+import outs
+
+
+def test_next_cards_flush_draw():
+    result = outs.next_cards(poker.parse_cards('Ah 5h'), poker.parse_cards('Kh 9h 2c'), [poker.parse_cards('Ks Kd')])
+    assert len(result.cards) == 45
+    assert result.combo == poker.CardCombo.highcard
+    assert result.share == 0
+    hearts = {poker.card_name(code) for code in result.cards[result.flips > 0].ravel()}
+    assert hearts == {'3h', '4h', '6h', '7h', '8h', 'Th', 'Jh', 'Qh'}
+    assert result.to_win == 8 and result.to_loss == 0
+    # 2h makes the hero a flush and the villain a full house
+    two = result.cards.ravel().tolist().index(poker.parse_card('2h'))
+    assert result.combos[two] == poker.CardCombo.flush
+    assert result.villains_after[two, 0] == poker.CardCombo.fullhouse
+    assert result.villains_improved[two, 0] and result.flips[two] == 0
+
+
+def test_next_cards_matches_best_poker_hand():
+    hero, board = poker.parse_cards('Jd Td'), poker.parse_cards('9c 8s 2d 2h')
+    result = outs.next_cards(hero, board)
+    assert len(result.cards) == 46
+    for row, combo in zip(result.cards.tolist(), result.combos):
+        assert combo == poker.strength_combo(poker.evaluate(hero + board + row))
+    assert result.improved.sum() == sum(combo > result.combo for combo in result.combos)
+    assert (result.shares == 1).all() and result.to_win == 0
+
+
+def test_next_cards_turn_and_river():
+    hero, board, villain = poker.parse_cards('Ah Ad'), poker.parse_cards('Kh 9h 2c'), poker.parse_cards('Qh Jh')
+    result = outs.next_cards(hero, board, [villain], n_cards=2)
+    assert result.cards.shape == (990, 2)
+    assert result.share == 1
+    for row, flip, share in zip(result.cards.tolist()[::37], result.flips[::37], result.shares[::37]):
+        mine, theirs = poker.evaluate(hero + board + row), poker.evaluate(villain + board + row)
+        assert share == (mine > theirs) + (mine == theirs) / 2.
+        assert flip == -(mine < theirs)
+    assert result.to_loss == (result.shares == 0).sum()
+
+
+def test_next_cards_invalid():
+    with assert_raises(ValueError):
+        outs.next_cards(poker.parse_cards('Ah 5h'), poker.parse_cards('Kh 9h'))
+    with assert_raises(ValueError):
+        outs.next_cards(poker.parse_cards('Ah 5h'), poker.parse_cards('Kh 9h 2c 3c'), n_cards=2)
+    with assert_raises(ValueError):
+        outs.next_cards(poker.parse_cards('Ah 5h'), poker.parse_cards('Kh 9h 2c'), [poker.parse_cards('Ah Kd')])
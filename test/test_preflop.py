@@ -0,0 +1,44 @@
+import itertools
+import os
+import tempfile
+import numpy as np
+import poker
+import preflop
+
+
+def test_combo_index():
+    for index in range(preflop.N_COMBOS):
+        assert preflop.combo_index(preflop.combo_cards(index)) == index
+    assert preflop.combo_index([51, 0]) == preflop.N_COMBOS - 51
+
+
+def test_hand_class():
+    classes = {preflop.hand_class(hole) for hole in itertools.combinations(range(poker.N_CARDS), 2)}
+    assert len(classes) == preflop.N_CLASSES
+    for index in range(preflop.N_CLASSES):
+        assert preflop.class_index(preflop.class_name(index)) == index
+    aks = [poker.AceCard(poker.Suit.Spades), poker.KingCard(poker.Suit.Spades)]
+    assert preflop.class_name(preflop.hand_class(aks)) == 'AKs'
+
+
+def test_tables_round_trip():
+    classes, combos = preflop.compute_tables(trials=40, processes=1, seed=1)
+    assert combos is None
+    assert (classes.astype(int) + classes.T - preflop.EQUITY_SCALE <= 1).all()
+
+    combos = np.full((preflop.N_COMBOS, preflop.N_COMBOS), preflop.EQUITY_SCALE // 2, dtype=np.uint16)
+    combos[0] = preflop._combo_row((0, 5, np.random.SeedSequence(2)))
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'preflop.bin')
+        preflop.write_tables(path, classes, combos)
+        table = preflop.PreflopTable(path)
+        assert table.class_equity('AA', 'KK') == classes[preflop.class_index('AA'), preflop.class_index('KK')] / float(preflop.EQUITY_SCALE)
+        assert table.equity(preflop.combo_cards(0), [0, 2]) is None
+        assert 0 <= table.equity(preflop.combo_cards(0), [2, 3]) <= 1
+
+        path = os.path.join(directory, 'classes.bin')
+        preflop.write_tables(path, classes)
+        table = preflop.PreflopTable(path)
+        assert table.combos is None
+        assert table.equity(poker.parse_cards('As Ks'), poker.parse_cards('As Qs')) is None
+        assert 0 <= table.equity(poker.parse_cards('As Ks'), poker.parse_cards('Ah Qh')) <= 1
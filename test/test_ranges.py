@@ -0,0 +1,77 @@
+from nose.tools import assert_raises
+import poker
+import equity
+import ranges
+
+
+def test_parse_card():
+    assert poker.parse_card('2h') == 0
+    assert poker.parse_card('As') == poker.encode_card(14, poker.Suit.Spades)
+    assert poker.card_name(poker.parse_card('Td')) == 'Td'
+    with assert_raises(ValueError):
+        poker.parse_card('1s')
+
+
+def test_parse_range():
+    sizes = {'AA': 6, 'QQ+': 18, '22-44': 18, 'AKs': 4, 'AKo': 12, 'AK': 16, 'KA': 16, 'ATs+': 16,
+             '76s-54s': 12, 'A5s-A2s': 16, 'AsKd': 1, 'QQ+, AKs, 76s-54s': 34}
+    for text, size in sizes.items():
+        assert len(ranges.parse_range(text)) == size
+    suited = ranges.parse_range('T9s')
+    assert all(poker.card_suit(first) == poker.card_suit(second) for first, second in suited.combos)
+    for text in ['AAs', 'AKx', 'AK-Q9', 'AsAs', 'A']:
+        with assert_raises(ValueError):
+            ranges.parse_range(text)
+
+
+def test_parse_range_weights():
+    weighted = ranges.parse_range('AA:0.5, AhAs, KK:0')
+    assert len(weighted) == 6
+    assert sorted(weighted.weights) == [0.5] * 5 + [1]
+
+
+def test_parse_range_blocked():
+    assert len(ranges.parse_range('AA, AKs', dead=poker.parse_cards('As'))) == 3 + 3
+    assert len(ranges.parse_range('AA').remove_blocked(poker.parse_cards('Ah Ad'))) == 1
+
+
+def test_range_equity_single_combos():
+    board = poker.parse_cards('Ah 7d 2c')
+    result = ranges.range_equity('AsKs', 'QdQc', board)
+    exact = equity.exact_equity(poker.parse_cards('As Ks'), [poker.parse_cards('Qd Qc')], board)
+    assert result.runouts == 1176
+    assert abs(result.equity - (exact.win + exact.tie / 2.)) < 1e-9
+
+
+def test_range_equity_card_removal():
+    board = poker.parse_cards('Ah 7d 2c')
+    hero = ranges.parse_range('AA, AKs', board)
+    villain = ranges.parse_range('KK, QQ, AK, AsQs:0.5', board)
+    total = weight = 0
+    for hero_combo, hero_weight in zip(hero.combos, hero.weights):
+        for villain_combo, villain_weight in zip(villain.combos, villain.weights):
+            if set(hero_combo) & set(villain_combo):
+                continue
+            exact = equity.exact_equity(list(hero_combo), [list(villain_combo)], board)
+            total += hero_weight * villain_weight * (exact.win + exact.tie / 2.)
+            weight += hero_weight * villain_weight
+    result = ranges.range_equity(hero, villain, board)
+    assert abs(result.equity - total / weight) < 1e-9
+    assert len(result.combo_equities) == len(hero)
+
+
+def test_range_equity_symmetric():
+    board = poker.parse_cards('Kh 9d 4c 4s')
+    result = ranges.range_equity('22+, AK', '22+, AK', board)
+    assert abs(result.equity - 0.5) < 1e-9
+
+
+def test_range_equity_sampled():
+    result = ranges.range_equity('AA', 'KK', trials=20000, seed=3)
+    assert result.runouts == 20000
+    assert abs(result.equity - 0.82) < 0.02
+
+
+def test_range_equity_blocked():
+    with assert_raises(ValueError):
+        ranges.range_equity('AsKs', 'AsQs', poker.parse_cards('2c 7d 9h'))
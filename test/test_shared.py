@@ -0,0 +1,39 @@
+from nose.tools import assert_raises
+import numpy as np
+import batch
+import shared
+
+
+def _worker_state(hands):
+    array = batch.rank_array(5)
+    return array.flags.writeable, batch.evaluate_batch(hands).tolist()
+
+
+def test_create_attach_install():
+    with shared.SharedTables.create(n_cards=(5,)) as tables:
+        assert (tables.arrays[5] == batch.rank_array(5)).all()
+        assert (tables.arrays['flush'] == batch.flush_array()).all()
+        attached = shared.SharedTables.attach(tables.spec)
+        own = batch.rank_array(5)
+        attached.install()
+        try:
+            assert batch.rank_array(5) is attached.arrays[5]
+            assert not attached.arrays[5].flags.writeable
+            with assert_raises(ValueError):
+                attached.arrays[5][0] = 1
+        finally:
+            attached.close()
+        assert batch.rank_array(5).flags.writeable
+        assert (batch.rank_array(5) == own).all()
+        name = tables.spec.name
+    with assert_raises(FileNotFoundError):
+        shared.SharedTables.attach(shared.TableSpec(name, []))
+
+
+def test_pool():
+    hands = batch.deal_cards(100, 5, np.random.default_rng(0))
+    with shared.pool(2, n_cards=(5,)) as workers:
+        results = workers.map(_worker_state, [hands] * 4)
+    for writeable, strengths in results:
+        assert not writeable
+        assert strengths == batch.evaluate_batch(hands).tolist()
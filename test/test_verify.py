@@ -0,0 +1,48 @@
+import itertools
+import numpy as np
+import poker
+import batch
+import verify
+
+
+def test_jobs_cover_rank_range():
+    jobs = verify._jobs(3, 100, 5000, 7)
+    assert len(jobs) == 7
+    hands = np.vstack([verify._block_hands(3, prefix, start, stop) for job in jobs for prefix, start, stop in job])
+    assert [tuple(hand) for hand in hands.tolist()] == list(itertools.combinations(range(poker.N_CARDS), 3))[100:5000]
+
+
+def test_verify_small_hands():
+    for n_cards in (1, 2, 3):
+        result = verify.verify(n_cards, ['evaluate', 'evaluate_batch', 'evaluate_masks'],
+                               reference='check_poker_hand', processes=1)
+        assert verify.passed(result)
+        assert result.hands == len(list(itertools.combinations(range(poker.N_CARDS), n_cards)))
+
+
+def test_verify_range_pool():
+    result = verify.verify(7, start=10 ** 6, stop=10 ** 6 + 40000, processes=2)
+    assert result.hands == 40000
+    assert verify.passed(result)
+    assert 'MISMATCH' not in verify.report(result)
+    assert sorted(result.category_mismatches) == ['evaluate', 'evaluate_batch', 'evaluate_masks']
+
+
+def test_verify_reports_mismatches():
+    verify.ENGINES['values_dropped'] = lambda cards: batch.evaluate_batch(cards) >> poker.STRENGTH_SHIFT << poker.STRENGTH_SHIFT
+    try:
+        result = verify.verify(5, ['values_dropped'], start=0, stop=20000, processes=1, max_examples=3)
+    finally:
+        del verify.ENGINES['values_dropped']
+    assert result.category_mismatches['values_dropped'] == 0
+    assert result.ordering_mismatches['values_dropped'] > 0
+    assert len(result.examples['values_dropped']) == 3
+    assert not verify.passed(result)
+
+
+def test_check_poker_hand_edge_cases():
+    hands = ['As Ah Ad Ac', 'As Ah Kd Kc', 'As Ah Kd Kc Qs Qh', 'As Ah Ad Kc', 'As Ah Ad Kc Kd Ks 2h 2c 2d']
+    for names in hands:
+        codes = poker.parse_cards(names)
+        strength = poker.evaluate(codes)
+        assert poker.PlayerHand.check_poker_hand(codes) == (poker.strength_combo(strength), poker.strength_values(strength))
@@ -0,0 +1,254 @@
+"""
+Exhaustive verification of the evaluators against a reference. All C(52, k) hands are enumerated
+in lexicographic order and split into ranges of combinatorial rank, which are verified in a pool
+of processes. Every engine is compared with the reference on the CardCombo and on the ordering of
+the hands, and the CardCombo frequencies are checked against the known table. The default
+reference is the cascade of check functions, which does not use the rank and flush tables shared
+by the fast engines.
+
+    python verify.py --cards 5 7 --engines evaluate evaluate_batch evaluate_masks
+"""
+import argparse
+import collections
+import functools
+import math
+import os
+import sys
+import numpy as np
+import poker
+import batch
+import shared
+
+
+# Number of hands of every CardCombo, highcard first, among all hands of 5 and 7 cards
+KNOWN_FREQUENCIES = {
+    5: (1302540, 1098240, 123552, 54912, 10200, 5108, 3744, 624, 40),
+    7: (23294460, 58627800, 31433400, 6461620, 6180020, 4047644, 3473184, 224848, 41584),
+}
+# Number of hands evaluated at once by every engine
+PIECE_SIZE = 1 << 16
+# Number of jobs per worker process, smaller ranges balance the pool better
+JOBS_PER_PROCESS = 8
+
+
+def _evaluate(cards):
+    '''The rank and flush table lookups of poker.evaluate, one hand at a time'''
+    return np.array([poker.evaluate(hand) for hand in cards.tolist()], dtype=np.int64)
+
+
+def _check_poker_hand(cards):
+    '''The cascade of check functions, one hand at a time, independent of the rank and flush tables'''
+    strengths = []
+    for hand in cards.tolist():
+        card_combo, card_values = poker.PlayerHand.check_poker_hand(hand)
+        strengths.append(poker.pack_strength(card_combo, card_values))
+    return np.array(strengths, dtype=np.int64)
+
+
+def _evaluate_masks(cards):
+    return batch.evaluate_masks(batch.hand_masks(cards))
+
+
+# Every engine maps an (N, k) array of card codes to (N,) strengths encoded like poker.pack_strength
+ENGINES = {
+    'evaluate': _evaluate,
+    'check_poker_hand': _check_poker_hand,
+    'evaluate_batch': batch.evaluate_batch,
+    'evaluate_masks': _evaluate_masks,
+}
+
+Verification = collections.namedtuple('Verification', ['n_cards', 'hands', 'frequencies', 'category_mismatches',
+                                                       'ordering_mismatches', 'examples'])
+Verification.__doc__ = '''The result of a verification: the number of hands, the count of every CardCombo by the
+reference, per engine the number of hands with another CardCombo and of neighbouring hands ordered otherwise,
+and per engine the first mismatching hands'''
+
+
+def _prefix_length(n_cards):
+    '''Number of leading cards fixed per block, so that a block holds at most C(51, 5) hands'''
+    return max(1, n_cards - 5)
+
+
+def _blocks(n_cards):
+    '''
+    Lists the blocks of hands sharing their leading cards, in lexicographic order
+    :return list of (prefix, size) pairs
+    '''
+    length = _prefix_length(n_cards)
+    return [(prefix, math.comb(poker.N_CARDS - 1 - prefix[-1], n_cards - length))
+            for prefix in batch.combinations(poker.N_CARDS, length).tolist()]
+
+
+@functools.lru_cache(maxsize=1)
+def _suffixes(n, k):
+    '''batch.combinations as int8, kept for the pieces of the same block'''
+    return batch.combinations(n, k).astype(np.int8)
+
+
+def _block_hands(n_cards, prefix, start, stop):
+    '''Returns the hands with combinatorial ranks start to stop within the block of a prefix'''
+    last = prefix[-1]
+    suffixes = _suffixes(poker.N_CARDS - 1 - last, n_cards - len(prefix))[start:stop] + np.int8(last + 1)
+    return np.hstack([np.tile(np.array(prefix, dtype=np.int8), (len(suffixes), 1)), suffixes])
+
+
+def _jobs(n_cards, start, stop, n_jobs):
+    '''
+    Splits the combinatorial rank range start to stop into about n_jobs ranges of whole or partial blocks
+    :return list of lists of (prefix, start, stop) block slices
+    '''
+    target = max(1, -(-(stop - start) // n_jobs))
+    jobs, job, size = [], [], 0
+    offset = 0
+    for prefix, block_size in _blocks(n_cards):
+        low, high = max(start - offset, 0), min(stop - offset, block_size)
+        offset += block_size
+        while low < high:
+            take = min(high - low, target - size)
+            job.append((prefix, low, low + take))
+            low += take
+            size += take
+            if size == target:
+                jobs.append(job)
+                job, size = [], 0
+    if job:
+        jobs.append(job)
+    return jobs
+
+
+def _compare(reference, strengths):
+    '''
+    Counts the hands whose CardCombo differs from the reference, and the neighbouring pairs of
+    hands in reference order that the engine orders otherwise
+    :return the two counts and the indices of the mismatching hands
+    '''
+    categories = (reference >> poker.STRENGTH_SHIFT) != (strengths >> poker.STRENGTH_SHIFT)
+    order = np.argsort(reference, kind='stable')
+    reference_steps = np.sign(np.diff(reference[order]))
+    steps = np.sign(np.diff(strengths[order].astype(np.int64)))
+    ordering = np.flatnonzero(reference_steps != steps)
+    mismatches = np.union1d(np.flatnonzero(categories), order[ordering + 1])
+    return int(np.count_nonzero(categories)), len(ordering), mismatches
+
+
+def verify_range(job):
+    '''
+    Verifies a range of hands, the work of a single process
+    :param job: tuple of the number of cards, the block slices, the reference name, the engine names
+        and the number of mismatching hands to keep per engine
+    :return a Verification of the range
+    '''
+    n_cards, slices, reference_name, engine_names, max_examples = job
+    frequencies = np.zeros(len(poker.CardCombo), dtype=np.int64)
+    category_mismatches = dict.fromkeys(engine_names, 0)
+    ordering_mismatches = dict.fromkeys(engine_names, 0)
+    examples = {name: [] for name in engine_names}
+    hands = 0
+    for prefix, start, stop in slices:
+        for piece in range(start, stop, PIECE_SIZE):
+            cards = _block_hands(n_cards, prefix, piece, min(piece + PIECE_SIZE, stop))
+            reference = np.asarray(ENGINES[reference_name](cards), dtype=np.int64)
+            hands += len(cards)
+            frequencies += np.bincount(reference >> poker.STRENGTH_SHIFT, minlength=len(poker.CardCombo))
+            for name in engine_names:
+                categories, ordering, mismatches = _compare(reference, np.asarray(ENGINES[name](cards)))
+                category_mismatches[name] += categories
+                ordering_mismatches[name] += ordering
+                room = max_examples - len(examples[name])
+                examples[name].extend(cards[index].tolist() for index in mismatches[:room])
+    return Verification(n_cards, hands, frequencies, category_mismatches, ordering_mismatches, examples)
+
+
+def verify(n_cards, engines=('evaluate', 'evaluate_batch', 'evaluate_masks'), reference='check_poker_hand', start=0,
+           stop=None, processes=None, max_examples=10, tables=None):
+    '''
+    Compares engines with a reference over all hands of n_cards cards, or over a range of their
+    combinatorial ranks in lexicographic order, in a pool of processes
+    :param n_cards: number of cards per hand, 1-7
+    :param engines: names of the ENGINES to verify
+    :param reference: name of the reference engine, check_poker_hand is independent of the tables
+    :param start: combinatorial rank of the first hand
+    :param stop: combinatorial rank after the last hand, C(52, n_cards) if None
+    :param processes: number of worker processes, all cores if None, no pool if 1
+    :param max_examples: number of mismatching hands kept per engine
+    :param tables: the shared.SharedTables of the workers, created for the call if None
+    :return a Verification
+    '''
+    for name in (reference,) + tuple(engines):
+        if name not in ENGINES:
+            raise ValueError('Unknown engine %r' % name)
+    if stop is None:
+        stop = math.comb(poker.N_CARDS, n_cards)
+    if processes is None:
+        processes = os.cpu_count() or 1
+    jobs = [(n_cards, slices, reference, tuple(engines), max_examples)
+            for slices in _jobs(n_cards, start, stop, processes * JOBS_PER_PROCESS)]
+    if processes <= 1:
+        results = [verify_range(job) for job in jobs]
+    else:
+        with shared.pool(processes, tables, n_cards=(n_cards,)) as pool:
+            results = pool.map(verify_range, jobs)
+
+    frequencies = np.zeros(len(poker.CardCombo), dtype=np.int64)
+    category_mismatches = dict.fromkeys(engines, 0)
+    ordering_mismatches = dict.fromkeys(engines, 0)
+    examples = {name: [] for name in engines}
+    for result in results:
+        frequencies += result.frequencies
+        for name in engines:
+            category_mismatches[name] += result.category_mismatches[name]
+            ordering_mismatches[name] += result.ordering_mismatches[name]
+            examples[name].extend(result.examples[name][:max_examples - len(examples[name])])
+    return Verification(n_cards, sum(result.hands for result in results), frequencies.tolist(),
+                        category_mismatches, ordering_mismatches, examples)
+
+
+def report(result):
+    '''Returns a Verification as text, with the known frequencies next to the counted ones when all hands were verified'''
+    known = KNOWN_FREQUENCIES.get(result.n_cards)
+    if known is not None and result.hands != math.comb(poker.N_CARDS, result.n_cards):
+        known = None
+    lines = ['%d hands of %d cards' % (result.hands, result.n_cards),
+             '%-14s %12s %12s' % ('combo', 'hands', 'known')]
+    for combo, count in zip(poker.CardCombo, result.frequencies):
+        expected = '' if known is None else known[combo]
+        flag = ' MISMATCH' if known is not None and count != expected else ''
+        lines.append('%-14s %12d %12s%s' % (combo.name, count, expected, flag))
+    for name in result.category_mismatches:
+        lines.append('%s: %d category mismatches, %d ordering mismatches' % (
+            name, result.category_mismatches[name], result.ordering_mismatches[name]))
+        for hand in result.examples[name]:
+            lines.append('    %s' % ' '.join(poker.card_name(code) for code in hand))
+    return '\n'.join(lines)
+
+
+def passed(result):
+    '''Returns True if no engine mismatched and the frequencies of a complete verification are the known ones'''
+    if any(result.category_mismatches.values()) or any(result.ordering_mismatches.values()):
+        return False
+    known = KNOWN_FREQUENCIES.get(result.n_cards)
+    if known is None or result.hands != math.comb(poker.N_CARDS, result.n_cards):
+        return True
+    return tuple(result.frequencies) == known
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Verifies the evaluators against a reference over all hands.')
+    parser.add_argument('--cards', type=int, nargs='+', default=[5, 7], help='hand sizes to enumerate')
+    parser.add_argument('--engines', nargs='+', default=['evaluate', 'evaluate_batch', 'evaluate_masks'],
+                        choices=sorted(ENGINES))
+    parser.add_argument('--reference', default='check_poker_hand', choices=sorted(ENGINES))
+    parser.add_argument('--start', type=int, default=0, help='combinatorial rank of the first hand')
+    parser.add_argument('--stop', type=int, default=None, help='combinatorial rank after the last hand')
+    parser.add_argument('--processes', type=int, default=None, help='worker processes, all cores by default')
+    args = parser.parse_args(argv)
+    success = True
+    for n_cards in args.cards:
+        result = verify(n_cards, args.engines, args.reference, args.start, args.stop, args.processes)
+        print(report(result))
+        success = success and passed(result)
+    return 0 if success else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())